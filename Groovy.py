@@ -1,12 +1,24 @@
 import os
-import json
 import sqlite3
+import threading
+from urllib.parse import urlparse
 import streamlit as st
 from PIL import Image
 import pandas as pd
 from dotenv import load_dotenv
 # Import the recommendation functions
-from rec import get_recommendations, cal_scores
+from rec import (rank_recommendations, get_recommendation_page, get_global_scores, cal_scores, load_snapshot,
+                 read_user_plays, REC_FETCH_DEADLINE)
+from feature_store import get_catalog_version, get_song_features, load_catalog, init_feature_store
+from catalog_snapshot import get_scoring_catalog
+import rec_cache
+import read_pool
+from cooccurrence import record_play, init_cooccurrence
+from batch_recommendations import get_user_recommendations, filter_fresh
+from similar_songs import get_similar_songs, init_neighbor_index
+import item2vec
+from audio_server import AUDIO_SERVER_URL, audio_url, is_loopback, server_reachable
+from library_index import META_DIR, IMG_DIR, MUSIC_DIR, DEFAULT_IMG, get_record, search, get_page
 # Import Firebase configuration and login page
 import firebase_config as fb
 from login import auth_page
@@ -16,10 +28,11 @@ load_dotenv()
 
 # Get configuration values from environment variables
 DB_PATH = os.getenv("DB_PATH", "hot100.db")
-META_DIR = "assets/meta"
-IMG_DIR = "assets/imgs"
-MUSIC_DIR = "assets/music"
-DEFAULT_IMG = "assets/default.jpg"
+# Recommendations shown per page
+REC_PAGE_SIZE = 5
+# Songs shown per page of the music library, laid out in rows of LIBRARY_COLUMNS
+LIBRARY_PAGE_SIZE = int(os.getenv("LIBRARY_PAGE_SIZE", 20))
+LIBRARY_COLUMNS = 5
 
 # Initialize session states for authentication
 if 'user_id' not in st.session_state:
@@ -137,12 +150,19 @@ if "recommendations" not in st.session_state:
     st.session_state.recommendations = []
 if "current_audio" not in st.session_state:
     st.session_state.current_audio = None
+if "rec_ranking" not in st.session_state:
+    st.session_state.rec_ranking = None  # scored ranking that further pages are read from
+if "rec_offset" not in st.session_state:
+    st.session_state.rec_offset = 0  # ranked recommendations already consumed
 if "last_recommendation_update" not in st.session_state:
     st.session_state.last_recommendation_update = 0
 if "needs_rerun" not in st.session_state:
     st.session_state.needs_rerun = False
+if "library_page" not in st.session_state:
+    st.session_state.library_page = 0  # zero-based page of the music library
 
-# Ensure the default image exists
+# Ensure the default image exists, once per process
+@st.cache_resource
 def ensure_assets_exist():
     """Ensure all required directories and default files exist."""
     # Create necessary directories
@@ -163,73 +183,134 @@ def ensure_assets_exist():
 # Run initialization at startup
 ensure_assets_exist()
 
-# Load music data
-def load_music_data():
-    records = []
-    if not os.path.exists(META_DIR):
-        return records
-    for file in os.listdir(META_DIR):
-        if file.endswith(".json"):
-            try:
-                meta_path = os.path.join(META_DIR, file)
-                with open(meta_path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    song_id = file.split(".")[0]
-                    image_path = os.path.join(IMG_DIR, f"{song_id}.jpg")
-                    music_path = os.path.join(MUSIC_DIR, f"{song_id}.mp3")
-                    
-                    # Use default image if the specific one doesn't exist
-                    if not os.path.exists(image_path):
-                        image_path = DEFAULT_IMG
-                        
-                    if os.path.exists(music_path):
-                        records.append({
-                            "id": song_id,
-                            "title": data.get("song"),
-                            "artist": data.get("artist"),
-                            "image": image_path,
-                            "audio": music_path
-                        })
-            except Exception as e:
-                print(f"Error loading song metadata for {file}: {e}")
-    return records
+# One SQLite connection per process for plays and per-song lookups, shared by every session under a lock
+@st.cache_resource
+def get_play_db():
+    """Open the process-wide connection that play writes and song lookups go through.
 
-# Fetch recommendations using the recommendation model
-def fetch_recommendations():
-    # Load the database into a DataFrame
-    with sqlite3.connect(DB_PATH) as conn:
-        df = pd.read_sql(f"SELECT * FROM hot100;", conn)
-    
-    # Drop unnecessary columns 
-    df.drop(['youtube_url', 'release_date', 'thumbnail', 'description'], axis=1, inplace=True)
-    
-    # Calculate scores and get recommendations with user-specific data
-    user_id = st.session_state.user_id if st.session_state.user_id else None
-    recommendations_list = get_recommendations(df, n=5, exclude_played=True, user_id=user_id)
-    
-    # Convert recommendations to the format used by the UI
+    The tables they use are created here once, so clicks and reruns never run DDL.
+    """
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    init_feature_store(conn)
+    init_cooccurrence(conn)
+    init_neighbor_index(conn)
+    return conn, threading.Lock()
+
+def browser_is_local():
+    """Whether the browser reached the app through a loopback address; assumed when Streamlit can't tell."""
+    context = getattr(st, "context", None)
+    host = context.headers.get("Host") if context is not None else None
+    return not host or is_loopback(urlparse(f"//{host}").hostname)
+
+def audio_source(song):
+    """The audio server URL st.audio streams a song from, or its file when the browser can't reach the server."""
+    if not AUDIO_SERVER_URL or not server_reachable():
+        return song["audio"]
+    # A loopback address only works for a browser on the same machine
+    if is_loopback(urlparse(AUDIO_SERVER_URL).hostname) and not browser_is_local():
+        return song["audio"]
+    # Streaming lets playback and seeking fetch only the bytes needed
+    return audio_url(song["id"])
+
+def format_recommendations(recommendations_list):
+    """Convert recommendations to the format used by the UI, skipping songs without audio."""
     recommendations = []
     for rec in recommendations_list:
-        song_id = rec['id']
-        image_path = os.path.join(IMG_DIR, f"{song_id}.jpg")
-        music_path = os.path.join(MUSIC_DIR, f"{song_id}.mp3")
-        
-        # Use default image if specific one doesn't exist
-        if not os.path.exists(image_path):
-            image_path = DEFAULT_IMG
-            
-        if os.path.exists(music_path):
+        # The library index knows which songs have audio and artwork
+        record = get_record(rec['id'])
+        if record:
             recommendations.append({
-                "id": song_id,
+                "id": rec['id'],
                 "title": rec['song'],
                 "artist": rec['artist'],
-                "image": image_path,
-                "audio": music_path
+                "image": record["image"],
+                "audio": record["audio"]
             })
     return recommendations
 
-# Load music records
-music_records = load_music_data()
+def load_rec_ranking(user_id, deadline=None, plays_read=None):
+    """Score the catalog for the user and keep the ranking in the session for paging.
+
+    deadline and plays_read are passed to load_snapshot when the caller has
+    already started reading the user's plays.
+    """
+    with sqlite3.connect(DB_PATH) as conn:
+        catalog_version = get_catalog_version(conn)
+        # Memory-mapped snapshot written at ingest, shared by every session and process
+        df, global_scores = get_scoring_catalog(catalog_version)
+        if df is None:
+            df = load_catalog(conn)
+    if global_scores is None:
+        # Popularity, engagement and the cold-start ranking are shared by every session
+        global_scores = get_global_scores(df, catalog_version)
+    snapshot = load_snapshot(user_id, deadline=deadline, plays_read=plays_read) if user_id else None
+    st.session_state.rec_ranking = rank_recommendations(
+        df, exclude_played=True, user_id=user_id, snapshot=snapshot, global_scores=global_scores
+    )
+    st.session_state.rec_offset = 0
+    return st.session_state.rec_ranking
+
+# Fetch recommendations using the recommendation model
+def fetch_recommendations():
+    user_id = st.session_state.user_id if st.session_state.user_id else None
+    # A new first page starts a new ranking
+    st.session_state.rec_ranking = None
+    st.session_state.rec_offset = 0
+    
+    # Serve the cached list if neither the catalog nor the user's plays changed
+    with sqlite3.connect(DB_PATH) as conn:
+        catalog_version = get_catalog_version(conn)
+    cached = rec_cache.get_recommendations(user_id, catalog_version)
+    if cached is not None:
+        return cached
+    
+    # Use the batch job's precomputed list while the user's plays haven't moved on from it
+    recommendations_list = []
+    deadline = plays_read = None
+    if user_id:
+        with sqlite3.connect(DB_PATH) as conn:
+            stored = get_user_recommendations(conn, user_id, catalog_version)
+        if stored:
+            # The same read feeds the live snapshot if the stored list can't be used
+            deadline = read_pool.deadline_after(REC_FETCH_DEADLINE)
+            plays_read = read_user_plays(user_id)
+            own, _ = read_pool.gather({'plays': plays_read}, deadline)
+            if 'plays' in own:
+                recommendations_list = filter_fresh(stored, own['plays'])
+        # Too few left after dropping songs played since the job ran to fill a page
+        if len(recommendations_list) < REC_PAGE_SIZE:
+            recommendations_list = []
+        recommendations_list = recommendations_list[:REC_PAGE_SIZE]
+    
+    complete = True
+    if not recommendations_list:
+        # Calculate scores and get the first page of recommendations with user-specific data
+        ranking = load_rec_ranking(user_id, deadline, plays_read)
+        recommendations_list = get_recommendation_page(ranking, 0, REC_PAGE_SIZE)
+        st.session_state.rec_offset = REC_PAGE_SIZE
+        complete = ranking['complete']
+    
+    recommendations = format_recommendations(recommendations_list)
+    # Lists scored without reads that missed the deadline are only kept briefly, then retried
+    ttl = rec_cache.REC_CACHE_TTL if complete else rec_cache.REC_CACHE_PARTIAL_TTL
+    rec_cache.put_recommendations(user_id, catalog_version, recommendations, ttl)
+    return recommendations
+
+def fetch_more_recommendations():
+    """Append the next page of recommendations from the session's ranking."""
+    ranking = st.session_state.rec_ranking
+    if ranking is None:
+        # The first page came from a cache, so score once now and page from the top
+        ranking = load_rec_ranking(st.session_state.user_id or None)
+    
+    shown = {rec["id"] for rec in st.session_state.recommendations}
+    more = []
+    while len(more) < REC_PAGE_SIZE and st.session_state.rec_offset < len(ranking['ids']):
+        page = get_recommendation_page(ranking, st.session_state.rec_offset, REC_PAGE_SIZE)
+        st.session_state.rec_offset += REC_PAGE_SIZE
+        more.extend(rec for rec in format_recommendations(page) if rec["id"] not in shown)
+    # Shallow copy so the list held by the recommendation cache is left untouched
+    st.session_state.recommendations = st.session_state.recommendations + more[:REC_PAGE_SIZE]
 
 # Function to handle logout
 def logout():
@@ -249,21 +330,31 @@ with col2:
     if st.button("Logout"):
         logout()
 
+# Library paging callbacks
+def reset_library_page():
+    st.session_state.library_page = 0
+
+def change_library_page(step):
+    st.session_state.library_page += step
+
 # Function to select a song and update play count
 def select_song(song_id):
-    # Find the song info
-    for record in music_records:
-        if record["id"] == song_id:
-            st.session_state.current_audio = record
-            song_info = record
-            break
+    # Library, recommendation and related-song tiles all come from the library index
+    song_info = get_record(song_id)
+    if song_info is None:
+        st.warning("This song is no longer available.")
+        return
+    st.session_state.current_audio = song_info
     
     # Update play count in local database
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("UPDATE hot100 SET count = count + 1 WHERE id = ?", (song_id,))
-    conn.commit()
-    conn.close()
+    conn, db_lock = get_play_db()
+    with db_lock:
+        conn.execute("UPDATE hot100 SET count = count + 1 WHERE id = ?", (song_id,))
+        conn.commit()
+        song_features = get_song_features(conn, song_id)
+        if st.session_state.user_id:
+            # Update the played song's co-occurrence with the user's other songs
+            record_play(conn, st.session_state.user_id, song_id)
     
     # Update play count in Firebase for the specific user
     if st.session_state.user_id:
@@ -273,6 +364,14 @@ def select_song(song_id):
             song_info["artist"], 
             song_info["title"]
         )
+        # Add this play to the user's artist/tag affinity profile
+        fb.update_affinity_profile(
+            st.session_state.user_id,
+            song_features["artists_list"],
+            song_features["tags_list"]
+        )
+        # The user's cached recommendations are now stale
+        rec_cache.bump_play_version(st.session_state.user_id)
 
     # Increment session play count
     st.session_state.total_plays += 1
@@ -296,25 +395,41 @@ if not st.session_state.recommendations and st.session_state.total_plays >= 10:
 # Recommendations Section
 if st.session_state.total_plays >= 10 and st.session_state.recommendations:
     st.markdown("### Recommendations For You")
-    rec_cols = st.columns(5)
-    for col, rec in zip(rec_cols, st.session_state.recommendations):
-        with col:
-            with st.container():
-                st.markdown(f'<div class="album-container">', unsafe_allow_html=True)
-                st.image(rec["image"], use_container_width=True)
-                st.button("▶ Play", key=f"rec_btn_{rec['id']}", on_click=select_song, args=(rec["id"],))
-                st.markdown(f'<div class="album-caption">{rec["title"]}<br>{rec["artist"]}</div>', unsafe_allow_html=True)
-                st.markdown('</div>', unsafe_allow_html=True)
+    recommendations = st.session_state.recommendations
+    for i in range(0, len(recommendations), REC_PAGE_SIZE):
+        rec_cols = st.columns(REC_PAGE_SIZE)
+        for col, rec in zip(rec_cols, recommendations[i:i + REC_PAGE_SIZE]):
+            with col:
+                with st.container():
+                    st.markdown(f'<div class="album-container">', unsafe_allow_html=True)
+                    st.image(rec["image"], use_container_width=True)
+                    st.button("▶ Play", key=f"rec_btn_{rec['id']}", on_click=select_song, args=(rec["id"],))
+                    st.markdown(f'<div class="album-caption">{rec["title"]}<br>{rec["artist"]}</div>', unsafe_allow_html=True)
+                    st.markdown('</div>', unsafe_allow_html=True)
+    st.button("More recommendations", key="more_recs_btn", on_click=fetch_more_recommendations)
     st.markdown("---")
 
 # Library Section
 st.markdown("### Music Library")
-num_cols = 5  # Number of columns per row
-for i in range(0, len(music_records), num_cols):
-    row_records = music_records[i:i + num_cols]
+search_col, field_col = st.columns([3, 1])
+with search_col:
+    st.text_input("Search", key="library_query", placeholder="Title, artist or tag", on_change=reset_library_page)
+with field_col:
+    st.selectbox("Search in", ["All", "Title", "Artist", "Tag"], key="library_field", on_change=reset_library_page)
+
+# Filter on the server and render only the current page
+search_field = None if st.session_state.library_field == "All" else st.session_state.library_field.lower()
+library_records = search(st.session_state.library_query, search_field)
+page_records, library_page, page_count = get_page(library_records, st.session_state.library_page, LIBRARY_PAGE_SIZE)
+st.session_state.library_page = library_page
+
+if not library_records:
+    st.info("No songs match your search.")
+for i in range(0, len(page_records), LIBRARY_COLUMNS):
+    row_records = page_records[i:i + LIBRARY_COLUMNS]
     
     with st.container():  # Ensure consistent row layout
-        cols = st.columns(num_cols)
+        cols = st.columns(LIBRARY_COLUMNS)
         for col, record in zip(cols, row_records):
             with col:
                 with st.container():
@@ -324,6 +439,15 @@ for i in range(0, len(music_records), num_cols):
                     st.markdown(f'<div class="album-caption">{record["title"]}<br>{record["artist"]}</div>', unsafe_allow_html=True)
                     st.markdown('</div>', unsafe_allow_html=True)
 
+if page_count > 1:
+    prev_col, info_col, next_col = st.columns([1, 2, 1])
+    with prev_col:
+        st.button("← Previous", key="library_prev", on_click=change_library_page, args=(-1,), disabled=library_page == 0)
+    with info_col:
+        st.markdown(f"Page {library_page + 1} of {page_count} · {len(library_records)} songs")
+    with next_col:
+        st.button("Next →", key="library_next", on_click=change_library_page, args=(1,), disabled=library_page >= page_count - 1)
+
 # Now Playing Section
 if st.session_state.current_audio:
     audio_player = st.session_state.current_audio
@@ -334,7 +458,41 @@ if st.session_state.current_audio:
     with col2:
         st.markdown(f"### {audio_player['title']}")
         st.markdown(f"**{audio_player['artist']}**")
-        st.audio(audio_player["audio"])
+        st.audio(audio_source(audio_player), format="audio/mpeg")
+    
+    # More Like This: precomputed content neighbors of the current song
+    conn, db_lock = get_play_db()
+    with db_lock:
+        similar_songs = get_similar_songs(conn, audio_player["id"], k=10)
+    similar_records = [record for record in (get_record(song_id) for song_id, _ in similar_songs) if record][:5]
+    if similar_records:
+        st.markdown("#### More Like This")
+        sim_cols = st.columns(5)
+        for col, record in zip(sim_cols, similar_records):
+            with col:
+                with st.container():
+                    st.markdown(f'<div class="album-container">', unsafe_allow_html=True)
+                    st.image(record["image"], use_container_width=True)
+                    st.button("▶ Play", key=f"sim_btn_{record['id']}", on_click=select_song, args=(record["id"],))
+                    st.markdown(f'<div class="album-caption">{record["title"]}<br>{record["artist"]}</div>', unsafe_allow_html=True)
+                    st.markdown('</div>', unsafe_allow_html=True)
+    
+    # Listeners Also Played: item2vec neighbors learned from everyone's play sequences
+    item2vec_model = item2vec.load_model()
+    if item2vec_model is not None:
+        also_played = item2vec.get_also_played(item2vec_model, audio_player["id"], k=10)
+        also_records = [record for record in (get_record(song_id) for song_id, _ in also_played) if record][:5]
+        if also_records:
+            st.markdown("#### Listeners Also Played")
+            also_cols = st.columns(5)
+            for col, record in zip(also_cols, also_records):
+                with col:
+                    with st.container():
+                        st.markdown(f'<div class="album-container">', unsafe_allow_html=True)
+                        st.image(record["image"], use_container_width=True)
+                        st.button("▶ Play", key=f"also_btn_{record['id']}", on_click=select_song, args=(record["id"],))
+                        st.markdown(f'<div class="album-caption">{record["title"]}<br>{record["artist"]}</div>', unsafe_allow_html=True)
+                        st.markdown('</div>', unsafe_allow_html=True)
         
 # Display play count for debugging (can be removed in production)
 with st.sidebar:
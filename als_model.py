@@ -0,0 +1,186 @@
+import os
+import time
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from dotenv import load_dotenv
+import firebase_config as fb
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Where trained factors are stored and read from
+ALS_MODEL_PATH = os.getenv("ALS_MODEL_PATH", "data/als_model.npz")
+# Latent factors per user and song
+ALS_FACTORS = 32
+# L2 regularization of the factors
+ALS_REGULARIZATION = 0.1
+# Confidence gained per log play count: c = 1 + alpha * log(1 + plays)
+ALS_ALPHA = 40.0
+# Alternating passes over users and songs
+ALS_ITERATIONS = 15
+
+# Process-wide model, reloaded when the file on disk changes
+_model = None
+_model_mtime = None
+_lock = threading.Lock()
+
+# ------- Training -------
+
+def build_confidence_matrix(all_user_plays):
+    """Build a CSR user x song matrix of log play counts from per-user play dicts."""
+    song_index = {}
+    user_ids = []
+    indptr = [0]
+    indices = []
+    data = []
+
+    for user_id, plays in all_user_plays.items():
+        user_ids.append(user_id)
+        for song_id, play_data in plays.items():
+            play_count = play_data.get('count', 0)
+            if play_count > 0:
+                indices.append(song_index.setdefault(song_id, len(song_index)))
+                data.append(np.log1p(play_count))
+        indptr.append(len(indices))
+
+    matrix = sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float64), indices, indptr),
+        shape=(len(user_ids), len(song_index))
+    )
+    matrix.sum_duplicates()
+    return matrix, np.array(user_ids, dtype=object), np.array(list(song_index), dtype=object)
+
+def solve_factors(matrix, fixed, regularization=ALS_REGULARIZATION, alpha=ALS_ALPHA, gram=None):
+    """Solve every row's factors against the fixed factors of the other side.
+
+    Implicit-feedback least squares (Hu, Koren & Volinsky, 2008): each observed
+    entry has preference 1 and confidence 1 + alpha * value, unobserved entries
+    have preference 0 and confidence 1. Only the observed entries of a row are
+    touched, on top of the shared fixed.T @ fixed, which can be passed in as gram.
+    """
+    n_factors = fixed.shape[1]
+    if gram is None:
+        gram = fixed.T @ fixed
+    gram = gram + regularization * np.eye(n_factors)
+    factors = np.zeros((matrix.shape[0], n_factors))
+
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        if start == end:
+            continue
+        observed = fixed[matrix.indices[start:end]]
+        confidence = alpha * matrix.data[start:end]
+        a = gram + (observed.T * confidence) @ observed
+        b = observed.T @ (1 + confidence)
+        factors[row] = np.linalg.solve(a, b)
+    return factors
+
+def train(matrix, factors=ALS_FACTORS, regularization=ALS_REGULARIZATION, alpha=ALS_ALPHA,
+          iterations=ALS_ITERATIONS, seed=0):
+    """Train user and song factors by alternating least squares."""
+    rng = np.random.default_rng(seed)
+    item_factors = rng.normal(0, 0.01, (matrix.shape[1], factors))
+    matrix_t = matrix.T.tocsr()
+
+    user_factors = np.zeros((matrix.shape[0], factors))
+    for _ in range(iterations):
+        user_factors = solve_factors(matrix, item_factors, regularization, alpha)
+        item_factors = solve_factors(matrix_t, user_factors, regularization, alpha)
+    return user_factors, item_factors
+
+def save_model(path, user_factors, item_factors, user_ids, song_ids, regularization, alpha):
+    """Persist trained factors with the ids they belong to."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.savez(
+        path,
+        user_factors=user_factors.astype(np.float32),
+        item_factors=item_factors.astype(np.float32),
+        user_ids=user_ids.astype(str),
+        song_ids=song_ids.astype(str),
+        regularization=regularization,
+        alpha=alpha,
+        trained_at=int(time.time()),
+    )
+
+# ------- Online Scoring -------
+
+def load_model(path=ALS_MODEL_PATH):
+    """Return the process-wide model, or None if none has been trained."""
+    global _model, _model_mtime
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    with _lock:
+        if _model is None or _model_mtime != mtime:
+            with np.load(path) as data:
+                item_factors = data['item_factors'].astype(np.float64)
+                _model = {
+                    'user_factors': data['user_factors'],
+                    'item_factors': item_factors,
+                    # Shared by every fold-in
+                    'item_gram': item_factors.T @ item_factors,
+                    'user_index': {user_id: row for row, user_id in enumerate(data['user_ids'])},
+                    'song_ids': pd.Index(data['song_ids'].astype(object)),
+                    'regularization': float(data['regularization']),
+                    'alpha': float(data['alpha']),
+                }
+            _model_mtime = mtime
+        return _model
+
+def fold_in(model, user_plays):
+    """Compute factors for a user who was not part of training from their play history."""
+    positions = model['song_ids'].get_indexer(list(user_plays))
+    counts = np.array([play_data.get('count', 0) for play_data in user_plays.values()], dtype=np.float64)
+    known = (positions >= 0) & (counts > 0)
+
+    row = sparse.csr_matrix(
+        (np.log1p(counts[known]), positions[known], [0, int(known.sum())]),
+        shape=(1, len(model['song_ids']))
+    )
+    row.sum_duplicates()
+    return solve_factors(
+        row, model['item_factors'], model['regularization'], model['alpha'], model['item_gram']
+    )[0]
+
+def user_vector(model, user_id, user_plays):
+    """Trained factors for known users, folded-in factors for users who appeared after training."""
+    row = model['user_index'].get(user_id)
+    if row is not None:
+        return model['user_factors'][row]
+    return fold_in(model, user_plays)
+
+def score_songs(model, user_id, user_plays, song_ids):
+    """Predicted preference of the user for each song; songs unknown to the model score 0."""
+    positions = model['song_ids'].get_indexer(song_ids)
+    scores = np.zeros(len(positions), dtype=np.float32)
+    known = positions >= 0
+    scores[known] = model['item_factors'][positions[known]] @ user_vector(model, user_id, user_plays)
+    return scores
+
+# ------- Training Command -------
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the implicit ALS model on every user's play counts.")
+    parser.add_argument("--factors", type=int, default=ALS_FACTORS, help="latent factors per user and song")
+    parser.add_argument("--iterations", type=int, default=ALS_ITERATIONS, help="alternating passes")
+    parser.add_argument("--regularization", type=float, default=ALS_REGULARIZATION, help="L2 regularization")
+    parser.add_argument("--alpha", type=float, default=ALS_ALPHA, help="confidence per log play count")
+    parser.add_argument("--user-limit", type=int, default=None, help="maximum number of users to train on")
+    parser.add_argument("--output", default=ALS_MODEL_PATH, help="where to save the factors")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    matrix, user_ids, song_ids = build_confidence_matrix(fb.get_all_users_play_data(limit=args.user_limit))
+    print(f"Training on {matrix.shape[0]} users x {matrix.shape[1]} songs ({matrix.nnz} plays)")
+
+    user_factors, item_factors = train(matrix, args.factors, args.regularization, args.alpha, args.iterations)
+    save_model(args.output, user_factors, item_factors, user_ids, song_ids, args.regularization, args.alpha)
+    print(f"Saved model to {args.output} in {time.time() - start_time:.1f}s")
+
+if __name__ == "__main__":
+    main()
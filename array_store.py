@@ -0,0 +1,51 @@
+import os
+import time
+import shutil
+import numpy as np
+
+# File in a store directory naming the live version
+POINTER_FILE = "CURRENT"
+# Versions kept on disk; older ones are deleted after a new one is written
+KEEP_VERSIONS = 2
+
+def save_version(base_dir, arrays, keep=KEEP_VERSIONS):
+    """Write arrays as .npy files into a new version directory and atomically make it current.
+
+    Readers that still have an older version memory-mapped keep working, since
+    replacing CURRENT never touches the files they opened.
+    """
+    version = str(time.time_ns())
+    version_dir = os.path.join(base_dir, version)
+    os.makedirs(version_dir)
+    # Plain .npy files so every process can memory-map them
+    for name, array in arrays.items():
+        np.save(os.path.join(version_dir, f"{name}.npy"), array)
+
+    pointer = os.path.join(base_dir, POINTER_FILE)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(pointer + ".tmp", pointer)
+
+    _prune(base_dir, keep)
+    return version
+
+def current_version(base_dir):
+    """Get the live version of a store, or None if nothing has been written yet."""
+    try:
+        with open(os.path.join(base_dir, POINTER_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def open_version(base_dir, version, names=None):
+    """Memory-map the named arrays of a version read-only (all of them when names is None)."""
+    version_dir = os.path.join(base_dir, version)
+    if names is None:
+        names = [file[:-len(".npy")] for file in os.listdir(version_dir) if file.endswith(".npy")]
+    return {name: np.load(os.path.join(version_dir, f"{name}.npy"), mmap_mode='r') for name in names}
+
+def _prune(base_dir, keep):
+    """Delete all but the newest `keep` version directories."""
+    versions = sorted((entry for entry in os.listdir(base_dir) if entry.isdigit()), key=int)
+    for version in versions[:-keep] if keep else []:
+        shutil.rmtree(os.path.join(base_dir, version), ignore_errors=True)
@@ -0,0 +1,267 @@
+import os
+import time
+import sqlite3
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from dotenv import load_dotenv
+from array_store import save_version, current_version, open_version
+from hashing import file_hash
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Get configuration values from environment variables
+DB_PATH = os.getenv("DB_PATH", "hot100.db")
+MUSIC_DIR = "assets/music"
+# Directory of the versioned, memory-mapped feature matrix
+AUDIO_FEATURES_DIR = os.getenv("AUDIO_FEATURES_DIR", "data/audio_features")
+# ffmpeg executable used to decode mp3 files
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
+
+# Decoding: mono at a fixed rate, limited to the first part of each track
+SAMPLE_RATE = 22050
+MAX_SECONDS = 120
+# Short-time Fourier transform frames
+FRAME_SIZE = 2048
+HOP_SIZE = 512
+# Tempo search range in beats per minute
+MIN_BPM = 60
+MAX_BPM = 200
+
+# One entry per column of the feature matrix
+FEATURE_NAMES = (
+    ["tempo_bpm", "tempo_strength"]
+    + [f"{name}_{stat}" for name in ("centroid", "bandwidth", "rolloff", "zcr", "rms") for stat in ("mean", "std")]
+    + ["flatness_mean"]
+    + [f"chroma_{pitch}" for pitch in ("C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B")]
+)
+
+# Process-wide memory-mapped features, reloaded when a new version is written
+_features = None
+_features_version = None
+_lock = threading.Lock()
+
+def init_audio_features_table(conn):
+    """Create the per-file feature cache table if it doesn't exist."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS audio_features (
+            id TEXT PRIMARY KEY,
+            file_hash TEXT,
+            file_size INTEGER,
+            file_mtime REAL,
+            features BLOB,
+            extracted_at INTEGER
+        )
+    """)
+    conn.commit()
+
+# ------- Decoding and Descriptors -------
+
+def decode_audio(path):
+    """Decode an audio file to mono float32 PCM at SAMPLE_RATE with ffmpeg."""
+    result = subprocess.run(
+        [FFMPEG_PATH, "-v", "error", "-i", path, "-t", str(MAX_SECONDS),
+         "-f", "f32le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-"],
+        capture_output=True, check=True
+    )
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+def _frames(samples):
+    """Split samples into overlapping frames of FRAME_SIZE every HOP_SIZE."""
+    if len(samples) < FRAME_SIZE:
+        samples = np.pad(samples, (0, FRAME_SIZE - len(samples)))
+    return np.lib.stride_tricks.sliding_window_view(samples, FRAME_SIZE)[::HOP_SIZE]
+
+def _tempo(power):
+    """Estimate tempo from the autocorrelation of spectral flux onsets."""
+    frame_rate = SAMPLE_RATE / HOP_SIZE
+    flux = np.maximum(np.diff(np.log1p(power), axis=0), 0).sum(axis=1)
+    if len(flux) < 2:
+        return 0.0, 0.0
+    # Subtract a one-second moving average so slow loudness changes don't dominate the long lags
+    window = min(int(frame_rate), len(flux))
+    flux = flux - np.convolve(flux, np.ones(window) / window, mode="same")
+    if not flux.any():
+        return 0.0, 0.0
+
+    autocorr = np.correlate(flux, flux, mode="full")[len(flux) - 1:]
+    lags = np.arange(int(frame_rate * 60 / MAX_BPM), min(int(frame_rate * 60 / MIN_BPM) + 1, len(autocorr)))
+    if len(lags) == 0:
+        return 0.0, 0.0
+
+    # Log-normal prior around 120 BPM to settle octave ambiguity
+    prior = np.exp(-0.5 * np.log2(60 * frame_rate / lags / 120) ** 2)
+    best = lags[np.argmax(autocorr[lags] * prior)]
+    return 60 * frame_rate / best, autocorr[best] / autocorr[0]
+
+def compute_descriptors(samples):
+    """Summarize decoded audio as tempo, spectral and chroma descriptors (see FEATURE_NAMES)."""
+    frames = _frames(samples) * np.hanning(FRAME_SIZE).astype(np.float32)
+    power = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+    freqs = np.fft.rfftfreq(FRAME_SIZE, 1 / SAMPLE_RATE)
+    total = power.sum(axis=1) + 1e-10
+
+    centroid = (power @ freqs) / total
+    bandwidth = np.sqrt((power @ freqs ** 2) / total - centroid ** 2)
+    rolloff = freqs[np.argmax(np.cumsum(power, axis=1) >= 0.85 * total[:, None], axis=1)]
+    flatness = np.exp(np.log(power + 1e-10).mean(axis=1)) / (power.mean(axis=1) + 1e-10)
+    signs = np.signbit(frames)
+    zcr = (signs[:, 1:] != signs[:, :-1]).mean(axis=1)
+    rms = np.sqrt((frames ** 2).mean(axis=1))
+
+    # Fold every audible bin onto its pitch class
+    audible = freqs > 27.5
+    pitch_class = np.round(12 * np.log2(freqs[audible] / 440.0) + 69).astype(int) % 12
+    chroma = np.zeros(12)
+    np.add.at(chroma, pitch_class, power[:, audible].sum(axis=0))
+    chroma /= chroma.sum() or 1
+
+    tempo, tempo_strength = _tempo(power)
+    stats = []
+    for values in (centroid, bandwidth, rolloff, zcr, rms):
+        stats += [values.mean(), values.std()]
+    return np.array([tempo, tempo_strength] + stats + [flatness.mean()] + chroma.tolist(), dtype=np.float32)
+
+def _extract(song_id, path, digest):
+    """Worker task: decode one file and compute its descriptors."""
+    return song_id, digest, compute_descriptors(decode_audio(path))
+
+# ------- Extraction Job -------
+
+def extract_features(conn, music_dir=MUSIC_DIR, workers=None):
+    """Extract descriptors for new or changed mp3 files in parallel and cache them by file hash.
+
+    Files whose size and modification time are unchanged are skipped without
+    being read; files whose contents hash the same are skipped without decoding.
+    """
+    init_audio_features_table(conn)
+    cached = {
+        row[0]: row[1:]
+        for row in conn.execute("SELECT id, file_hash, file_size, file_mtime FROM audio_features")
+    }
+
+    tasks = []
+    present = set()
+    for file in os.listdir(music_dir) if os.path.exists(music_dir) else []:
+        if not file.endswith(".mp3"):
+            continue
+        song_id = file[:-len(".mp3")]
+        path = os.path.join(music_dir, file)
+        stat = os.stat(path)
+        present.add(song_id)
+
+        entry = cached.get(song_id)
+        if entry and entry[1] == stat.st_size and entry[2] == stat.st_mtime:
+            continue
+        digest = file_hash(path)
+        if entry and entry[0] == digest:
+            conn.execute(
+                "UPDATE audio_features SET file_size = ?, file_mtime = ? WHERE id = ?",
+                (stat.st_size, stat.st_mtime, song_id)
+            )
+            continue
+        tasks.append((song_id, path, digest, stat))
+
+    failed = 0
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_extract, song_id, path, digest): stat for song_id, path, digest, stat in tasks}
+            for future in as_completed(futures):
+                stat = futures[future]
+                try:
+                    song_id, digest, features = future.result()
+                except Exception as e:
+                    print(f"Error extracting audio features: {e}")
+                    failed += 1
+                    continue
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO audio_features
+                        (id, file_hash, file_size, file_mtime, features, extracted_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    (song_id, digest, stat.st_size, stat.st_mtime, features.tobytes(), int(time.time()))
+                )
+
+    # Drop features of songs whose files were deleted
+    for song_id in set(cached) - present:
+        conn.execute("DELETE FROM audio_features WHERE id = ?", (song_id,))
+    conn.commit()
+    return len(tasks) - failed, failed
+
+def write_feature_matrix(conn, base_dir=AUDIO_FEATURES_DIR):
+    """Write the cached descriptors as a standardized float32 matrix for memory-mapped use."""
+    init_audio_features_table(conn)
+    rows = conn.execute("SELECT id, features FROM audio_features ORDER BY id").fetchall()
+    if not rows:
+        return None
+
+    ids = np.array([song_id for song_id, _ in rows], dtype=str)
+    matrix = np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows])
+
+    # Standardize each descriptor, then L2-normalize rows so dot products are cosine similarities
+    matrix = (matrix - matrix.mean(axis=0)) / (matrix.std(axis=0) + 1e-6)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    return save_version(base_dir, {"ids": ids, "features": matrix.astype(np.float32)})
+
+# ------- Lookup -------
+
+def load_feature_matrix(base_dir=AUDIO_FEATURES_DIR):
+    """Return the process-wide memory-mapped feature matrix, or None if none has been written."""
+    global _features, _features_version
+    version = current_version(base_dir)
+    if version is None:
+        return None
+
+    with _lock:
+        if _features is None or _features_version != version:
+            arrays = open_version(base_dir, version, ("ids", "features"))
+            arrays['index'] = {song_id: row for row, song_id in enumerate(arrays['ids'].tolist())}
+            _features = arrays
+            _features_version = version
+        return _features
+
+def audio_similarity(features, song_ids, play_counts):
+    """Cosine similarity of every song to the play-count weighted mean of the played songs.
+
+    song_ids are the songs to score and play_counts maps played song ids to
+    counts. Songs without audio features, or less similar than an unrelated
+    song would be, score 0.
+    """
+    index = features['index']
+    played = [(index[song_id], count) for song_id, count in play_counts.items() if song_id in index and count > 0]
+    scores = np.zeros(len(song_ids), dtype=np.float32)
+    if not played:
+        return scores
+
+    rows, weights = zip(*played)
+    profile = np.average(features['features'][list(rows)], axis=0, weights=weights)
+    profile /= np.linalg.norm(profile) or 1
+
+    positions = np.array([index.get(song_id, -1) for song_id in song_ids])
+    known = positions >= 0
+    scores[known] = np.maximum(features['features'][positions[known]] @ profile, 0)
+    return scores
+
+# ------- Extraction Command -------
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract audio features from the downloaded mp3 files.")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    with sqlite3.connect(DB_PATH) as conn:
+        extracted, failed = extract_features(conn, workers=args.workers)
+        version = write_feature_matrix(conn)
+
+    print(f"\nSummary:")
+    print(f"  - Extracted {extracted} files in {time.time() - start_time:.1f}s")
+    print(f"  - {failed} files failed")
+    print(f"  - Feature matrix version: {version}")
+
+if __name__ == "__main__":
+    main()
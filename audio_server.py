@@ -0,0 +1,202 @@
+import os
+import re
+import time
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from email.utils import formatdate, parsedate_to_datetime
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+MUSIC_DIR = "assets/music"
+# Interface and port the audio server listens on
+AUDIO_SERVER_HOST = os.getenv("AUDIO_SERVER_HOST", "127.0.0.1")
+AUDIO_SERVER_PORT = int(os.getenv("AUDIO_SERVER_PORT", 8502))
+# Address the browser loads audio from; when unset the app sends whole files through Streamlit
+AUDIO_SERVER_URL = os.getenv("AUDIO_SERVER_URL", "").rstrip("/")
+
+# Seconds a check of whether the audio server answers is trusted
+AUDIO_SERVER_CHECK_INTERVAL = 30
+# Host names that only reach the machine they are used on
+LOOPBACK_HOSTS = ("localhost", "127.0.0.1", "::1")
+
+# Song ids are uuids, so nothing else can name a file outside MUSIC_DIR
+AUDIO_PATH = re.compile(r"^/music/([0-9A-Za-z-]+)\.mp3$")
+RANGE_HEADER = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Process-wide reachability checks, shared by every session
+_checks = {}  # base_url -> (checked_at, reachable)
+_checks_lock = threading.Lock()
+
+def audio_url(song_id, base_url=AUDIO_SERVER_URL):
+    """URL of a song on the audio server."""
+    return f"{base_url}/music/{song_id}.mp3"
+
+def is_loopback(host):
+    """Whether a host name only reaches the machine it is used on."""
+    return host in LOOPBACK_HOSTS or (host or "").startswith("127.")
+
+def server_reachable(base_url=AUDIO_SERVER_URL):
+    """Whether the audio server at base_url answers, checked at most every AUDIO_SERVER_CHECK_INTERVAL seconds."""
+    now = time.monotonic()
+    with _checks_lock:
+        entry = _checks.get(base_url)
+        if entry and now - entry[0] < AUDIO_SERVER_CHECK_INTERVAL:
+            return entry[1]
+
+    try:
+        urllib.request.urlopen(urllib.request.Request(f"{base_url}/music/", method="HEAD"), timeout=0.5)
+        reachable = True
+    except urllib.error.HTTPError:
+        # Any HTTP answer, including the expected 404, means the server is up
+        reachable = True
+    except (OSError, ValueError):
+        reachable = False
+
+    with _checks_lock:
+        _checks[base_url] = (now, reachable)
+    return reachable
+
+def parse_range(header, size):
+    """(start, end) byte positions, inclusive, requested by a single-range Range header.
+
+    Returns None when there is no usable Range header, so the whole file is
+    sent, and raises ValueError when the range can't be satisfied.
+    """
+    match = RANGE_HEADER.match(header or "")
+    if not match or match.groups() == ("", ""):
+        return None
+
+    start, end = match.groups()
+    if not start:
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0 or size == 0:
+            raise ValueError(f"unsatisfiable range {header}")
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or end < start:
+        raise ValueError(f"unsatisfiable range {header}")
+    return start, end
+
+class AudioRequestHandler(BaseHTTPRequestHandler):
+    """Serves mp3 files from MUSIC_DIR with byte-range support so players can stream and seek."""
+
+    music_dir = MUSIC_DIR
+
+    def do_HEAD(self):
+        self._send_audio(send_body=False)
+
+    def do_GET(self):
+        self._send_audio(send_body=True)
+
+    def _send_audio(self, send_body):
+        match = AUDIO_PATH.match(self.path.split("?", 1)[0])
+        if not match:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        path = os.path.join(self.music_dir, f"{match.group(1)}.mp3")
+
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        with f:
+            stat = os.fstat(f.fileno())
+            size = stat.st_size
+            etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+            last_modified = formatdate(stat.st_mtime, usegmt=True)
+
+            if self._not_modified(etag, stat.st_mtime):
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+            # A Range with a stale If-Range validator gets the whole file
+            range_header = self.headers.get("Range")
+            if_range = self.headers.get("If-Range")
+            if if_range and if_range not in (etag, last_modified):
+                range_header = None
+
+            try:
+                byte_range = parse_range(range_header, size)
+            except ValueError:
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            start, end = byte_range or (0, size - 1)
+            length = end - start + 1
+            self.send_response(HTTPStatus.PARTIAL_CONTENT if byte_range else HTTPStatus.OK)
+            self.send_header("Content-Type", "audio/mpeg")
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(length))
+            if byte_range:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+
+            if send_body and length:
+                try:
+                    # Sent straight from the file, so large files never sit in memory
+                    self.wfile.flush()
+                    self.connection.sendfile(f, start, length)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Players routinely drop a request when they seek elsewhere
+                    pass
+
+    def _not_modified(self, etag, mtime):
+        """Whether the client's cached copy is still current."""
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match:
+            return etag in [tag.strip() for tag in if_none_match.split(",")]
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def log_message(self, format, *args):
+        # Range requests are too frequent to log each one
+        pass
+
+def start_server(host=AUDIO_SERVER_HOST, port=AUDIO_SERVER_PORT):
+    """Start the audio server on a background thread and return it; call shutdown() to stop it."""
+    server = ThreadingHTTPServer((host, port), AudioRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="audio-server", daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream the downloaded mp3 files over HTTP with byte-range support.")
+    parser.add_argument("--host", default=AUDIO_SERVER_HOST, help="interface to listen on")
+    parser.add_argument("--port", type=int, default=AUDIO_SERVER_PORT, help="port to listen on")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), AudioRequestHandler)
+    server.daemon_threads = True
+    print(f"Serving {MUSIC_DIR} on http://{args.host}:{args.port}/music/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
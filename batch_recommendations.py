@@ -0,0 +1,201 @@
+import os
+import time
+import sqlite3
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dotenv import load_dotenv
+import firebase_config as fb
+from feature_store import get_catalog_version, load_catalog
+from rec import get_recommendations, make_snapshot, index_plays, compute_global_scores
+from catalog_snapshot import get_scoring_catalog
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Get database path from environment variable
+DB_PATH = os.getenv("DB_PATH", "hot100.db")
+# Number of recommendations stored per user, enough to fill a page after dropping songs played since
+DEFAULT_TOP_N = 20
+# Users scored per task sent to a worker
+DEFAULT_SHARD_SIZE = 50
+# Plays a user can add after the job ran before their stored list is recomputed live instead
+BATCH_MAX_NEW_PLAYS = int(os.getenv("BATCH_MAX_NEW_PLAYS", 10))
+
+# Read-only inputs shared by every task in a worker process
+_catalog = None
+_plays = None
+_play_index = None
+_global_scores = None
+
+def init_recommendations_table(conn):
+    """Create the precomputed recommendations table if it doesn't exist."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_recommendations (
+            user_id TEXT,
+            rank INTEGER,
+            song_id TEXT,
+            recommendation_score REAL,
+            generation INTEGER,
+            catalog_version INTEGER,
+            created_at INTEGER,
+            play_total INTEGER,
+            PRIMARY KEY (user_id, rank)
+        )
+    """)
+
+    # Tables created before play totals were stored
+    columns = {col[1] for col in conn.execute("PRAGMA table_info(user_recommendations)").fetchall()}
+    if "play_total" not in columns:
+        conn.execute("ALTER TABLE user_recommendations ADD COLUMN play_total INTEGER")
+    conn.commit()
+
+def count_plays(user_plays):
+    """Total plays in a user's play dicts."""
+    return sum(play.get('count', 0) for play in user_plays.values())
+
+def get_user_recommendations(conn, user_id, catalog_version=None):
+    """Get a user's precomputed recommendations, or an empty list if none are stored.
+
+    When catalog_version is given, rows computed against another catalog are
+    ignored. Each recommendation carries the play_total the job scored from;
+    see filter_fresh.
+    """
+    init_recommendations_table(conn)
+    query = """
+        SELECT r.song_id, h.song, h.artist, r.recommendation_score, r.rank, r.play_total
+        FROM user_recommendations r JOIN hot100 h ON h.id = r.song_id
+        WHERE r.user_id = ?
+    """
+    params = [user_id]
+    if catalog_version is not None:
+        query += " AND r.catalog_version = ?"
+        params.append(catalog_version)
+    rows = conn.execute(query + " ORDER BY r.rank", params).fetchall()
+
+    return [
+        {'rank': rank, 'song': song, 'artist': artist, 'recommendation_score': score, 'id': song_id,
+         'play_total': play_total}
+        for song_id, song, artist, score, rank, play_total in rows
+    ]
+
+def filter_fresh(recommendations, user_plays):
+    """Keep stored recommendations that still reflect the user's current plays.
+
+    The whole list is dropped when its play total is unknown, or when the
+    user's current total isn't within BATCH_MAX_NEW_PLAYS above it. Songs the
+    user has played since the job ran are dropped from what remains.
+    """
+    if not recommendations:
+        return []
+    play_total = recommendations[0]['play_total']
+    new_plays = count_plays(user_plays) - play_total if play_total is not None else -1
+    if not 0 <= new_plays <= BATCH_MAX_NEW_PLAYS:
+        return []
+    return [rec for rec in recommendations if rec['id'] not in user_plays]
+
+# ------- Workers -------
+
+def _init_worker(catalog, plays, global_scores, catalog_version):
+    """Keep the shared catalog features, play data and global scores for every task in this worker.
+    
+    When catalog is None the worker maps the catalog snapshot itself instead
+    of receiving a pickled copy; if the snapshot no longer matches
+    catalog_version, the worker's shards fail (see _score_shard). The
+    cohort's play matrix is built once here rather than for every user scored.
+    """
+    global _catalog, _plays, _play_index, _global_scores
+    if catalog is None:
+        catalog, global_scores = get_scoring_catalog(catalog_version)
+    _catalog = catalog
+    _plays = plays
+    _play_index = index_plays(plays)
+    _global_scores = global_scores
+
+def _score_shard(user_ids, top_n):
+    """Compute the top-N recommendations for a shard of users."""
+    if _catalog is None:
+        # Scoring a newer catalog would store it under the job's older version
+        raise RuntimeError("the catalog changed since the job started; run it again")
+    results = {}
+    for user_id in user_ids:
+        results[user_id] = get_recommendations(
+            _catalog.copy(deep=False), n=top_n, exclude_played=True, user_id=user_id,
+            snapshot=make_snapshot(user_id, _plays, play_index=_play_index), global_scores=_global_scores
+        )
+    return results
+
+# ------- Job -------
+
+def write_recommendations(conn, results, generation, catalog_version, play_totals):
+    """Replace the stored recommendations of every scored user with this generation's.
+
+    play_totals maps each user to the total plays their list was scored from.
+    """
+    created_at = int(time.time())
+    conn.executemany("DELETE FROM user_recommendations WHERE user_id = ?", [(user_id,) for user_id in results])
+    conn.executemany(
+        """
+        INSERT INTO user_recommendations
+            (user_id, rank, song_id, recommendation_score, generation, catalog_version, created_at, play_total)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (user_id, rec['rank'], rec['id'], float(rec['recommendation_score']), generation, catalog_version,
+             created_at, play_totals[user_id])
+            for user_id, recommendations in results.items()
+            for rec in recommendations
+        ]
+    )
+    conn.commit()
+
+def run_batch(workers=None, top_n=DEFAULT_TOP_N, shard_size=DEFAULT_SHARD_SIZE, user_limit=None):
+    """Compute and store the top-N recommendations for every user."""
+    start_time = time.time()
+    with sqlite3.connect(DB_PATH) as conn:
+        init_recommendations_table(conn)
+        catalog_version = get_catalog_version(conn)
+        generation = (conn.execute("SELECT MAX(generation) FROM user_recommendations").fetchone()[0] or 0) + 1
+        
+        # Workers map the ingest snapshot themselves when it is current; otherwise they get a copy
+        catalog = global_scores = None
+        if get_scoring_catalog(catalog_version)[0] is None:
+            catalog = load_catalog(conn)
+            # User-independent scores are computed once for the whole job
+            global_scores = compute_global_scores(catalog)
+
+    # Read every user's plays once; workers score from this snapshot without touching Firebase
+    plays = fb.get_all_users_play_data(limit=user_limit)
+    user_ids = list(plays)
+    play_totals = {user_id: count_plays(user_plays) for user_id, user_plays in plays.items()}
+    shards = [user_ids[i:i + shard_size] for i in range(0, len(user_ids), shard_size)]
+    print(f"Scoring {len(user_ids)} users in {len(shards)} shards (generation {generation})")
+
+    failed_shards = 0
+    with sqlite3.connect(DB_PATH) as conn, ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(catalog, plays, global_scores, catalog_version)
+    ) as executor:
+        futures = [executor.submit(_score_shard, shard, top_n) for shard in shards]
+        for future in as_completed(futures):
+            try:
+                write_recommendations(conn, future.result(), generation, catalog_version, play_totals)
+            except Exception as e:
+                print(f"Error scoring shard: {e}")
+                failed_shards += 1
+
+    print(f"\nSummary:")
+    print(f"  - Scored {len(user_ids)} users in {time.time() - start_time:.1f}s")
+    print(f"  - Generation {generation} at catalog version {catalog_version}")
+    print(f"  - {failed_shards} shards failed")
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute recommendations for every Groovy user.")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--top-n", type=int, default=DEFAULT_TOP_N, help="recommendations stored per user")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="users per worker task")
+    parser.add_argument("--user-limit", type=int, default=None, help="maximum number of users to score")
+    args = parser.parse_args()
+
+    run_batch(workers=args.workers, top_n=args.top_n, shard_size=args.shard_size, user_limit=args.user_limit)
+
+if __name__ == "__main__":
+    main()
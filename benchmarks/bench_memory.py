@@ -0,0 +1,121 @@
+import os
+import sys
+import json
+import sqlite3
+import argparse
+import resource
+import subprocess
+import tempfile
+import tracemalloc
+
+# Allow running as `python benchmarks/bench_memory.py` from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from synthetic import make_catalog, make_user_plays, install_fake_firebase
+
+# Loaders compared, each measured in its own process
+MODES = ["select_all", "compact"]
+# Approximate length of a YouTube description in characters
+DESCRIPTION_LENGTH = 1500
+
+def _rss_mb():
+    """Current resident set size of this process in MB, or the peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        # ru_maxrss is KB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+def build_database(path, n_songs, seed):
+    """Write a synthetic hot100 database, including the text payload the scorer doesn't need."""
+    catalog = make_catalog(n_songs, seed=seed)
+    rng = np.random.default_rng(seed)
+    words = np.array(["music", "official", "video", "subscribe", "lyrics", "tour", "album", "stream", "new", "live"])
+    n_words = DESCRIPTION_LENGTH // 8
+    catalog['description'] = [" ".join(row) for row in words[rng.integers(0, len(words), (n_songs, n_words))]]
+    catalog['thumbnail'] = [f"https://i.ytimg.com/vi/{song_id[:11]}/maxresdefault.jpg" for song_id in catalog['id']]
+    catalog['youtube_url'] = [f"https://www.youtube.com/watch?v={song_id[:11]}" for song_id in catalog['id']]
+    catalog['release_date'] = "20250101"
+
+    with sqlite3.connect(path) as conn:
+        catalog.to_sql("hot100", conn, index=False)
+        # Parse features once so both loaders only read them
+        from feature_store import sync_features
+        sync_features(conn)
+
+def measure_child(mode, db_path, n_users, seed):
+    """Load the catalog with one loader, score it for a user, and report the process footprint."""
+    import pandas as pd
+    with sqlite3.connect(db_path) as conn:
+        songs = pd.read_sql("SELECT id, artist, song FROM hot100", conn)
+
+    # Plays are generated before the baseline so they are not counted against the loader
+    plays = make_user_plays(songs, n_users, seed=seed)
+    del songs
+    install_fake_firebase(plays)
+    import rec
+    from feature_store import attach_features, load_catalog
+    baseline_mb = _rss_mb()
+
+    with sqlite3.connect(db_path) as conn:
+        if mode == "select_all":
+            df = attach_features(pd.read_sql("SELECT * FROM hot100", conn), conn)
+        else:
+            df = load_catalog(conn)
+    loaded_mb = _rss_mb()
+    frame_mb = df.memory_usage(deep=True).sum() / 1024 / 1024
+
+    # Traced after the resident measurement so tracemalloc's own overhead isn't counted
+    tracemalloc.start()
+    user_id = next(iter(plays))
+    rec.get_recommendations(df, n=5, exclude_played=True, user_id=user_id)
+    scoring_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "mode": mode,
+        "catalog_rss_mb": round(loaded_mb - baseline_mb, 1),
+        "frame_deep_mb": round(frame_mb, 1),
+        "scoring_peak_mb": round(scoring_peak / 1024 / 1024, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the per-process memory of the catalog loaders.")
+    parser.add_argument("--songs", type=int, default=100000, help="catalog size")
+    parser.add_argument("--users", type=int, default=1000, help="number of synthetic users")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the synthetic data")
+    parser.add_argument("--output", default=None, help="optional results JSON path")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure_child(args.child, args.db, args.users, args.seed)))
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "hot100.db")
+        print(f"Building a {args.songs}-song database...")
+        build_database(db_path, args.songs, args.seed)
+
+        for mode in MODES:
+            output = subprocess.check_output([
+                sys.executable, os.path.abspath(__file__), "--child", mode, "--db", db_path,
+                "--users", str(args.users), "--seed", str(args.seed)
+            ], text=True)
+            result = json.loads(output.strip().splitlines()[-1])
+            result["songs"] = args.songs
+            results.append(result)
+            print(f"  {mode:<12} resident catalog {result['catalog_rss_mb']:>8.1f} MB   "
+                  f"scoring peak {result['scoring_peak_mb']:>8.1f} MB")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"results": results}, f, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import tracemalloc
+
+# Allow running as `python benchmarks/bench_rec.py` from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from synthetic import make_catalog, make_user_plays, install_fake_firebase
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+def _git_commit():
+    """Get the current commit hash, or None outside a git checkout."""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+def measure(func, repeat=1):
+    """Run func `repeat` times for the median wall time, then once more under tracemalloc for peak memory."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return float(np.median(times)), peak / 1024 / 1024
+
+def stages(rec, catalog, user_id, snapshot):
+    """Benchmark stages as (name, callable). Each callable works on a fresh copy of the catalog."""
+    parsed = catalog.copy()
+    parsed['artists_list'] = parsed['artist'].apply(rec.process_artists)
+    parsed['tags_list'] = parsed['tags'].apply(rec.process_tags)
+
+    return [
+        ("parse_features", lambda: (
+            catalog['artist'].apply(rec.process_artists),
+            catalog['tags'].apply(rec.process_tags),
+        )),
+        ("affinity_scores", lambda: rec.calculate_affinity_scores(parsed, snapshot['user_plays'])),
+        ("collaborative", lambda: rec.get_collaborative_recommendations(user_id, parsed, snapshot=snapshot)),
+        ("cal_scores_global", lambda: rec.cal_scores(parsed.copy())),
+        ("cal_scores_user", lambda: rec.cal_scores(parsed.copy(), user_id, snapshot=snapshot)),
+        ("get_recommendations", lambda: rec.get_recommendations(
+            parsed.copy(), n=5, exclude_played=True, user_id=user_id, snapshot=snapshot
+        )),
+    ]
+
+def run(sizes, n_users, repeat, seed):
+    """Benchmark every stage at every catalog size."""
+    results = []
+    for n_songs in sizes:
+        print(f"\n== {n_songs} songs, {n_users} users ==")
+        catalog = make_catalog(n_songs, seed=seed)
+        plays = make_user_plays(catalog, n_users, seed=seed)
+
+        # The stand-in must be registered before rec is imported
+        fb = install_fake_firebase(plays)
+        sys.modules.pop('rec', None)
+        import rec
+
+        user_id = next(iter(plays))
+        snapshot = rec.load_snapshot(user_id)
+
+        for stage, func in stages(rec, catalog, user_id, snapshot):
+            fb.calls.clear()
+            wall_time, peak_mb = measure(func, repeat)
+            results.append({
+                "songs": n_songs,
+                "users": n_users,
+                "stage": stage,
+                "wall_time_s": round(wall_time, 6),
+                "peak_memory_mb": round(peak_mb, 3),
+                "firebase_calls": sum(fb.calls.values()) // (repeat + 1),
+            })
+            print(f"  {stage:<22} {wall_time * 1000:>10.1f} ms {peak_mb:>10.1f} MB")
+    return results
+
+def compare(results, baseline_path):
+    """Print the relative change of each stage against a previous results file."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["songs"], r["stage"]): r for r in json.load(f)["results"]}
+
+    print(f"\nCompared with {baseline_path}:")
+    for result in results:
+        previous = baseline.get((result["songs"], result["stage"]))
+        if previous and previous["wall_time_s"] > 0:
+            change = result["wall_time_s"] / previous["wall_time_s"] - 1
+            print(f"  {result['songs']:>8} {result['stage']:<22} {change:+8.1%} time")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Groovy recommender on synthetic catalogs.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="catalog sizes to benchmark")
+    parser.add_argument("--users", type=int, default=1000, help="number of synthetic users")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage (median is reported)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the synthetic data")
+    parser.add_argument("--output", default=None, help="results JSON path (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", default=None, help="previous results JSON to compare against")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.users, args.repeat, args.seed)
+
+    commit = _git_commit()
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit or int(time.time())}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "commit": commit,
+            "timestamp": int(time.time()),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "results": results,
+        }, f, indent=4)
+    print(f"\nSaved results to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import os
+import sys
+import argparse
+
+# Allow running as `python benchmarks/check_scores.py` from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from synthetic import make_catalog, make_user_plays, install_fake_firebase
+
+# Score columns both cal_scores paths must agree on
+SCORE_COLUMNS = ['artist_affinity_score', 'tag_affinity_score', 'recommendation_score']
+
+def compare_paths(rec, catalog, user_id, top_k, rtol):
+    """List the ways the vectorized and row-wise cal_scores paths disagree for one user (None for anonymous)."""
+    snapshot = rec.load_snapshot(user_id) if user_id else None
+    vectorized = rec.cal_scores(catalog.copy(), user_id, vectorized=True, snapshot=snapshot)
+    row_wise = rec.cal_scores(catalog.copy(), user_id, vectorized=False, snapshot=snapshot)
+
+    problems = []
+    for column in SCORE_COLUMNS:
+        expected = row_wise[column].to_numpy(dtype=float)
+        actual = vectorized[column].to_numpy(dtype=float)
+        if not np.allclose(actual, expected, rtol=rtol, atol=1e-6):
+            worst = np.nanmax(np.abs(actual - expected))
+            problems.append(f"{column} differs by up to {worst:.3g}")
+
+    expected_top = rec.top_k_indices(row_wise['recommendation_score'], top_k)
+    actual_top = rec.top_k_indices(vectorized['recommendation_score'], top_k)
+    if set(expected_top) != set(actual_top):
+        problems.append(f"top {top_k} differs in {len(set(expected_top) - set(actual_top))} songs")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check that the vectorized cal_scores path matches the row-wise one on a synthetic catalog."
+    )
+    parser.add_argument("--songs", type=int, default=2000, help="synthetic catalog size")
+    parser.add_argument("--users", type=int, default=200, help="synthetic users in the cohort")
+    parser.add_argument("--checked-users", type=int, default=20, help="users whose scores are compared")
+    parser.add_argument("--top-k", type=int, default=20, help="size of the ranking that must match")
+    parser.add_argument("--rtol", type=float, default=1e-4, help="relative tolerance of the score comparison")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the synthetic data")
+    args = parser.parse_args()
+
+    catalog = make_catalog(args.songs, seed=args.seed)
+    plays = make_user_plays(catalog, args.users, seed=args.seed)
+
+    # The stand-in must be registered before rec is imported
+    install_fake_firebase(plays)
+    import rec
+
+    mismatches = 0
+    for user_id in [None] + list(plays)[:args.checked_users]:
+        problems = compare_paths(rec, catalog, user_id, args.top_k, args.rtol)
+        if problems:
+            mismatches += 1
+            print(f"  {user_id or 'anonymous'}: {'; '.join(problems)}")
+
+    print(f"\nSummary:")
+    print(f"  - Compared {args.checked_users + 1} users on {args.songs} songs")
+    print(f"  - {mismatches} users differ between the vectorized and row-wise paths")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
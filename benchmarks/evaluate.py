@@ -0,0 +1,295 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+# Allow running as `python benchmarks/evaluate.py` from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from scipy import sparse
+from synthetic import make_catalog, make_user_plays, install_fake_firebase
+
+DEFAULT_K = [5, 10, 20]
+# Users scored per NumPy batch; memory grows with batch size x catalog size
+DEFAULT_BATCH_SIZE = 256
+# Users whose requests are timed through the serving path per variant
+DEFAULT_SERVE_USERS = 20
+# Songs kept from the neighbors backend, as in get_collaborative_recommendations
+COLLAB_TOP_N = 10
+
+# Scoring variants compared by default, as overrides of rec.DEFAULT_WEIGHTS
+VARIANTS = {
+    "default": {},
+    "no_collaborative": {"collaborative": 0},
+    "no_recency": {"recency": 0},
+    "affinity_heavy": {"artist_affinity": 0.3, "tag_affinity": 0.3},
+    "non_personalized": {"count": 0, "artist_affinity": 0, "tag_affinity": 0, "collaborative": 0, "recency": 0},
+}
+
+# ------- Data -------
+
+def load_data(args):
+    """Get the catalog and every user's plays, from a database and export or synthetic."""
+    if args.db:
+        import sqlite3
+        from feature_store import load_catalog
+        with sqlite3.connect(args.db) as conn:
+            catalog = load_catalog(conn)
+    else:
+        catalog = make_catalog(args.songs, seed=args.seed)
+
+    if args.plays:
+        # {user_id: {song_id: play_doc}}, as returned by firebase_config.get_all_users_play_data
+        with open(args.plays, "r", encoding="utf-8") as f:
+            plays = json.load(f)
+    else:
+        plays = make_user_plays(catalog, args.users, seed=args.seed)
+    return catalog, plays
+
+def split_plays(plays, song_ids, holdout, seed=0):
+    """Hold out a random fraction of each user's played catalog songs.
+
+    Users with fewer than two played catalog songs are skipped. Returns the
+    kept user ids, the train plays as play dicts and as a user x song count
+    matrix, and the held-out songs as a boolean user x song matrix.
+    """
+    rng = np.random.default_rng(seed)
+    song_index = {song_id: col for col, song_id in enumerate(song_ids)}
+    user_ids, train_plays = [], {}
+    train_rows, train_cols, train_counts = [], [], []
+    test_rows, test_cols = [], []
+
+    for user_id, user_plays in plays.items():
+        played = [
+            song_id for song_id, play_data in user_plays.items()
+            if play_data.get('count', 0) > 0 and song_id in song_index
+        ]
+        if len(played) < 2:
+            continue
+        row = len(user_ids)
+        user_ids.append(user_id)
+
+        n_test = min(max(int(round(len(played) * holdout)), 1), len(played) - 1)
+        test = set(rng.choice(len(played), n_test, replace=False).tolist())
+        train_plays[user_id] = {}
+        for position, song_id in enumerate(played):
+            if position in test:
+                test_rows.append(row)
+                test_cols.append(song_index[song_id])
+            else:
+                train_plays[user_id][song_id] = user_plays[song_id]
+                train_rows.append(row)
+                train_cols.append(song_index[song_id])
+                train_counts.append(user_plays[song_id]['count'])
+
+    shape = (len(user_ids), len(song_ids))
+    train = sparse.csr_matrix((np.asarray(train_counts, dtype=np.float32), (train_rows, train_cols)), shape=shape)
+    test = sparse.csr_matrix((np.ones(len(test_rows), dtype=bool), (test_rows, test_cols)), shape=shape)
+    return user_ids, train_plays, train, test
+
+# ------- Batched Scoring -------
+
+def collaborative_scores(rec, train, train_csc, rows):
+    """Neighbors-backend scores for a batch of users, scoring each against every other user."""
+    scores = np.zeros((len(rows), train.shape[1]), dtype=np.float32)
+    for i, row in enumerate(rows):
+        target = train[row].toarray().ravel()
+        similarities = rec.calculate_user_similarity_sparse(target, train_csc)
+        similarities[row] = -np.inf  # Never the user's own neighbor
+        neighbors = rec.top_k_indices(similarities, rec.COLLAB_NEIGHBORS)
+        neighbor_plays = train[neighbors]
+        song_scores = neighbor_plays.T @ np.maximum(similarities[neighbors], 0)
+
+        # Skip songs the user has already played and songs no neighbor has played
+        candidates = (neighbor_plays.getnnz(axis=0) > 0) & (target == 0)
+        song_scores = np.where(candidates, song_scores, -np.inf)
+        top = rec.top_k_indices(song_scores, min(COLLAB_TOP_N, int(candidates.sum())))
+        scores[i, top] = song_scores[top]
+    return scores
+
+def score_batch(rec, train, train_csc, rows, global_scores, weights):
+    """Score every song for a batch of users as a users x songs matrix, mirroring cal_scores.
+
+    Affinities come from the catalog's artist/tag incidence, so plays of songs
+    outside the catalog don't count. Components weighted 0 are not computed.
+    """
+    weights = {**rec.DEFAULT_WEIGHTS, **weights}
+    counts = train[rows]
+    count_normalized = counts.toarray() / counts.max(axis=1).toarray()
+    components = {
+        'count_normalized': count_normalized,
+        'recency_factor': count_normalized * 1.5,
+        'engagement_ratio': global_scores['engagement_ratio'],
+        'popularity_score': global_scores['popularity_score'],
+        'collaborative_score': 0,
+        'audio_similarity_score': 0,
+    }
+    for kind in ('artist', 'tag'):
+        components[f"{kind}_affinity_score"] = 0
+        if weights[f"{kind}_affinity"]:
+            matrix = global_scores['incidence'][kind][0]
+            token_counts = (counts @ matrix).toarray()
+            token_counts /= np.maximum(token_counts.sum(axis=1, keepdims=True), 1e-12)
+            components[f"{kind}_affinity_score"] = (matrix @ token_counts.T).T
+    if weights['collaborative']:
+        components['collaborative_score'] = collaborative_scores(rec, train, train_csc, rows)
+
+    scores = np.broadcast_to(rec.blend_scores(components, weights), count_normalized.shape).copy()
+    # Already played songs are excluded, as in the app
+    scores[count_normalized > 0] = -np.inf
+    return scores
+
+def top_k(scores, k):
+    """Column indices of each row's k highest scores, best first."""
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1)
+
+def ranking_metrics(top, relevant, n_relevant, ks):
+    """Summed hit-rate@k and NDCG@k for a batch, with binary relevance."""
+    hits = np.take_along_axis(relevant, top, axis=1)
+    discounts = 1 / np.log2(np.arange(top.shape[1]) + 2)
+    ideal = np.cumsum(discounts)
+
+    metrics = {}
+    for k in ks:
+        dcg = hits[:, :k] @ discounts[:k]
+        idcg = ideal[np.minimum(n_relevant, k) - 1]
+        metrics[f"hit_rate@{k}"] = float(hits[:, :k].any(axis=1).sum())
+        metrics[f"ndcg@{k}"] = float((dcg / idcg).sum())
+    return metrics
+
+def evaluate(rec, train, test, global_scores, weights, ks, batch_size):
+    """Replay the held-out plays of every user; returns mean metrics and the batched scoring time."""
+    train_csc = train.tocsc()
+    n_relevant = np.asarray(test.sum(axis=1)).ravel().astype(int)
+    totals = {}
+    elapsed = 0.0
+    for start in range(0, train.shape[0], batch_size):
+        rows = np.arange(start, min(start + batch_size, train.shape[0]))
+        start_time = time.perf_counter()
+        top = top_k(score_batch(rec, train, train_csc, rows, global_scores, weights), max(ks))
+        elapsed += time.perf_counter() - start_time
+
+        batch = ranking_metrics(top, test[rows].toarray(), n_relevant[rows], ks)
+        for name, value in batch.items():
+            totals[name] = totals.get(name, 0.0) + value
+    return {name: value / train.shape[0] for name, value in totals.items()}, elapsed
+
+def batch_peak_mb(rec, train, test, global_scores, weights, ks, batch_size):
+    """Peak memory of scoring and ranking one batch."""
+    rows = np.arange(min(batch_size, train.shape[0]))
+    tracemalloc.start()
+    top_k(score_batch(rec, train, train.tocsc(), rows, global_scores, weights), max(ks))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+# ------- Serving Cost -------
+
+def serving_cost(rec, catalog, train_plays, global_scores, weights, n_users):
+    """Median latency and peak memory of one request through rank_recommendations."""
+    times = []
+    for user_id in list(train_plays)[:n_users]:
+        snapshot = rec.make_snapshot(user_id, train_plays)
+        start_time = time.perf_counter()
+        ranking = rec.rank_recommendations(catalog.copy(deep=False), True, user_id, snapshot, global_scores, weights)
+        rec.get_recommendation_page(ranking, 0, 10)
+        times.append(time.perf_counter() - start_time)
+
+    user_id = next(iter(train_plays))
+    tracemalloc.start()
+    rec.rank_recommendations(
+        catalog.copy(deep=False), True, user_id, rec.make_snapshot(user_id, train_plays), global_scores, weights
+    )
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return float(np.median(times)) * 1000, peak / 1024 / 1024
+
+# ------- Command -------
+
+def parse_variant(value):
+    """Parse NAME=JSON into a named weight override."""
+    name, _, overrides = value.partition("=")
+    if not name or not overrides:
+        raise argparse.ArgumentTypeError("expected NAME='{\"weight\": value, ...}'")
+    try:
+        return name, json.loads(overrides)
+    except json.JSONDecodeError as e:
+        raise argparse.ArgumentTypeError(f"invalid weights for {name}: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate recommendation quality and cost on held-out plays.")
+    parser.add_argument("--songs", type=int, default=10000, help="synthetic catalog size")
+    parser.add_argument("--users", type=int, default=2000, help="number of synthetic users")
+    parser.add_argument("--db", default=None, help="hot100 database to evaluate instead of a synthetic catalog")
+    parser.add_argument("--plays", default=None, help="exported plays JSON to evaluate instead of synthetic users")
+    parser.add_argument("--holdout", type=float, default=0.2, help="fraction of each user's songs held out")
+    parser.add_argument("--k", type=int, nargs="+", default=DEFAULT_K, help="cutoffs for hit-rate and NDCG")
+    parser.add_argument("--variant", type=parse_variant, action="append", default=[],
+                        help="extra variant as NAME='{\"tag_affinity\": 0.3}' (repeatable)")
+    parser.add_argument("--only", nargs="+", default=None, help="evaluate only these variants")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="users scored per batch")
+    parser.add_argument("--serve-users", type=int, default=DEFAULT_SERVE_USERS, help="requests timed per variant")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the data and the split")
+    parser.add_argument("--output", default=None, help="optional results JSON path")
+    args = parser.parse_args()
+
+    catalog, plays = load_data(args)
+    user_ids, train_plays, train, test = split_plays(plays, catalog['id'].tolist(), args.holdout, args.seed)
+    if not user_ids:
+        print("No users have at least two played catalog songs")
+        return
+
+    # The stand-in must be registered before rec is imported; requests only see the train plays
+    install_fake_firebase(train_plays)
+    import rec
+
+    variants = {**VARIANTS, **dict(args.variant)}
+    if args.only:
+        variants = {name: variants[name] for name in args.only if name in variants}
+    for name, weights in variants.items():
+        unknown = set(weights) - set(rec.DEFAULT_WEIGHTS)
+        if unknown:
+            parser.error(f"unknown weights in {name}: {', '.join(sorted(unknown))}")
+
+    if 'artists_list' not in catalog.columns:
+        catalog['artists_list'] = catalog['artist'].apply(rec.process_artists)
+        catalog['tags_list'] = catalog['tags'].apply(rec.process_tags)
+    global_scores = rec.compute_global_scores(catalog)
+    print(f"Evaluating {len(user_ids)} users on {len(catalog)} songs ({test.nnz} held-out plays)\n")
+
+    results = []
+    for name, weights in variants.items():
+        metrics, elapsed = evaluate(rec, train, test, global_scores, weights, args.k, args.batch_size)
+        serve_ms, serve_peak_mb = serving_cost(rec, catalog, train_plays, global_scores, weights, args.serve_users)
+        result = {
+            "variant": name,
+            "weights": {**rec.DEFAULT_WEIGHTS, **weights},
+            **{metric: round(value, 4) for metric, value in metrics.items()},
+            "eval_ms_per_user": round(elapsed * 1000 / len(user_ids), 3),
+            "batch_peak_mb": round(batch_peak_mb(rec, train, test, global_scores, weights, args.k, args.batch_size), 1),
+            "serve_ms": round(serve_ms, 2),
+            "serve_peak_mb": round(serve_peak_mb, 1),
+        }
+        results.append(result)
+
+        quality = "  ".join(f"hit@{k} {metrics[f'hit_rate@{k}']:.3f} ndcg@{k} {metrics[f'ndcg@{k}']:.3f}" for k in args.k)
+        print(f"  {name:<18} {quality}")
+        print(f"  {'':<18} eval {result['eval_ms_per_user']:.2f} ms/user   "
+              f"serve {serve_ms:.1f} ms, peak {serve_peak_mb:.1f} MB")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "users": len(user_ids),
+                "songs": len(catalog),
+                "holdout": args.holdout,
+                "results": results,
+            }, f, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import sys
+import json
+import time
+import types
+import uuid
+from collections import Counter
+import numpy as np
+import pandas as pd
+
+# Vocabulary used to build realistic artist names and tags
+FIRST_WORDS = ["Lil", "Young", "Big", "DJ", "MC", "The", "Saint", "King", "Queen", "Baby"]
+LAST_WORDS = ["Nova", "Rivers", "Blaze", "Stone", "Carter", "Vega", "Moon", "Sky", "Wolf", "Grey"]
+GENRES = ["Pop", "Hip Hop", "Rap", "R&B", "Country", "Rock", "Dance", "Latin", "Indie", "Soul"]
+GENERIC_TAGS = ["Music Video", "Official Music Video", "Official Video", "Lyrics", "Live", "Remix", "2024", "2025"]
+
+def _artist_names(n_artists, rng):
+    """Generate distinct artist names like 'Lil Nova 42'."""
+    first = rng.choice(FIRST_WORDS, n_artists)
+    last = rng.choice(LAST_WORDS, n_artists)
+    return [f"{a} {b} {i}" for i, (a, b) in enumerate(zip(first, last))]
+
+def make_catalog(n_songs, seed=0):
+    """Build a hot100-shaped DataFrame with Featuring/&/with artist strings and JSON tag arrays."""
+    rng = np.random.default_rng(seed)
+    artists = _artist_names(max(n_songs // 5, 10), rng)
+
+    # Zipf-like artist popularity: a few artists have many songs
+    primary = np.minimum(rng.zipf(1.3, n_songs) - 1, len(artists) - 1)
+    featured = rng.integers(0, len(artists), n_songs)
+    joiner = rng.choice(["", " Featuring ", " & ", " with ", " Feat. "], n_songs, p=[0.6, 0.2, 0.1, 0.05, 0.05])
+    artist_strings = [
+        artists[p] if not j else f"{artists[p]}{j}{artists[f]}"
+        for p, f, j in zip(primary, featured, joiner)
+    ]
+
+    tag_pool = np.array([f"tag {i}" for i in range(2000)] + GENRES + GENERIC_TAGS)
+    n_tags = rng.integers(3, 12, n_songs)
+    tag_draws = np.split(tag_pool[rng.integers(0, len(tag_pool), n_tags.sum())], np.cumsum(n_tags)[:-1])
+    tags = [json.dumps([artists[p]] + drawn.tolist()) for p, drawn in zip(primary, tag_draws)]
+
+    views = rng.lognormal(14, 2, n_songs).astype(np.int64)
+    now = int(time.time())
+    return pd.DataFrame({
+        'id': [str(uuid.UUID(int=int(x))) for x in rng.integers(0, 2**62, n_songs)],
+        'artist': artist_strings,
+        'song': [f"Song {i}" for i in range(n_songs)],
+        'count': rng.poisson(0.5, n_songs),
+        'uploader': [artists[p] for p in primary],
+        'duration': rng.integers(120, 300, n_songs),
+        'views': views,
+        'like_count': (views * rng.uniform(0.002, 0.03, n_songs)).astype(np.int64),
+        'tags': tags,
+        'last_updated': now - rng.integers(0, 604800, n_songs),
+    })
+
+def make_user_plays(catalog, n_users, mean_history=30, seed=0):
+    """Build {user_id: {song_id: play_doc}} maps shaped like firebase_config.get_user_play_counts."""
+    rng = np.random.default_rng(seed + 1)
+    song_ids = catalog['id'].to_numpy()
+    artists = catalog['artist'].to_numpy()
+    songs = catalog['song'].to_numpy()
+
+    # Popular songs are played by many users; sample through the CDF to stay O(history) per user
+    weights = 1.0 / np.arange(1, len(song_ids) + 1) ** 0.8
+    cdf = np.cumsum(weights / weights.sum())
+
+    plays = {}
+    for u in range(n_users):
+        history = max(int(rng.exponential(mean_history)), 1)
+        picks = np.unique(np.minimum(np.searchsorted(cdf, rng.random(history)), len(song_ids) - 1))
+        counts = rng.geometric(0.3, len(picks))
+        plays[f"user_{u}"] = {
+            song_ids[i]: {'song_id': song_ids[i], 'artist': artists[i], 'song': songs[i], 'count': int(c)}
+            for i, c in zip(picks, counts)
+        }
+    return plays
+
+def install_fake_firebase(plays, profiles=None):
+    """Register an in-process stand-in for firebase_config backed by the given play maps.
+
+    Must be called before rec is imported. The module's `calls` counter records
+    how many times each read/write function was used.
+    """
+    profiles = {} if profiles is None else profiles
+    module = types.ModuleType('firebase_config')
+    module.calls = Counter()
+
+    def get_user_play_counts(user_id):
+        module.calls['get_user_play_counts'] += 1
+        return dict(plays.get(user_id, {}))
+
+    def get_all_users_play_data(limit=50, deadline=None):
+        module.calls['get_all_users_play_data'] += 1
+        user_ids = list(plays)[:limit] if limit is not None else list(plays)
+        module.calls['get_user_play_counts'] += len(user_ids)
+        return {user_id: dict(plays[user_id]) for user_id in user_ids}
+
+    def read_all_users_play_data(limit=50, deadline=None, exclude=()):
+        module.calls['read_all_users_play_data'] += 1
+        user_ids = list(plays)[:limit] if limit is not None else list(plays)
+        user_ids = [user_id for user_id in user_ids if user_id not in exclude]
+        module.calls['get_user_play_counts'] += len(user_ids)
+        return {user_id: dict(plays[user_id]) for user_id in user_ids}, True
+
+    def get_affinity_profile(user_id):
+        module.calls['get_affinity_profile'] += 1
+        return profiles.get(user_id)
+
+    def set_affinity_profile(user_id, profile):
+        module.calls['set_affinity_profile'] += 1
+        profiles[user_id] = profile
+
+    def update_affinity_profile(user_id, artists, tags):
+        module.calls['update_affinity_profile'] += 1
+
+    def update_play_count(user_id, song_id, artist, song_name):
+        module.calls['update_play_count'] += 1
+
+    def get_user_info(user_id):
+        module.calls['get_user_info'] += 1
+        return {'username': user_id, 'total_plays': 0}
+
+    for func in (get_user_play_counts, get_all_users_play_data, read_all_users_play_data,
+                 get_affinity_profile, set_affinity_profile, update_affinity_profile,
+                 update_play_count, get_user_info):
+        setattr(module, func.__name__, func)
+
+    sys.modules['firebase_config'] = module
+    return module
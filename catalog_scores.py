@@ -0,0 +1,66 @@
+import numpy as np
+from scipy import sparse
+
+# Catalog-only scoring shared by the app (rec.py) and the ingest scripts (catalog_snapshot.py).
+# Nothing here reads Firebase, so ingest can run without credentials.
+
+# Precision of the per-song score columns; float32 halves their memory
+SCORE_DTYPE = np.float32
+
+# ------- Sparse Incidence -------
+
+def build_incidence_matrix(token_lists):
+    """Build a sparse song x token incidence matrix from per-song token lists."""
+    vocab = {}
+    indptr = [0]
+    indices = []
+    for tokens in token_lists:
+        for token in tokens:
+            indices.append(vocab.setdefault(token, len(vocab)))
+        indptr.append(len(indices))
+    
+    data = np.ones(len(indices), dtype=np.float64)
+    matrix = sparse.csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, len(vocab)))
+    # Repeated tokens within a song count once per occurrence, like the row-wise loops
+    matrix.sum_duplicates()
+    return matrix, vocab
+
+# ------- Global Catalog Scores -------
+
+def compute_global_scores(df):
+    """Compute the score components that are the same for every user, and the cold-start ranking."""
+    n = len(df)
+    if 'views' in df.columns and 'like_count' in df.columns:
+        views = df['views']
+        likes = df['like_count']
+        has_stats = views.notna() & likes.notna()
+        engagement_ratio = (likes / views.clip(lower=1)).where(has_stats, 0).to_numpy(dtype=SCORE_DTYPE)
+        
+        views_normalized = (views / (views.max() or 1)).to_numpy(dtype=SCORE_DTYPE)
+        likes_normalized = (likes / (likes.max() or 1)).to_numpy(dtype=SCORE_DTYPE)
+        popularity_score = (views_normalized * SCORE_DTYPE(0.7)) + (likes_normalized * SCORE_DTYPE(0.3))
+    else:
+        engagement_ratio = np.zeros(n, dtype=SCORE_DTYPE)
+        views_normalized = likes_normalized = None
+        popularity_score = np.zeros(n, dtype=SCORE_DTYPE)
+    
+    # Songs ranked for users without play history: popularity & engagement only
+    cold_start_score = popularity_score * SCORE_DTYPE(0.7) + engagement_ratio * SCORE_DTYPE(0.3)
+    
+    # Song x artist/tag incidence matrices only depend on the catalog too
+    incidence = None
+    if 'artists_list' in df.columns and 'tags_list' in df.columns:
+        incidence = {
+            'artist': build_incidence_matrix(df['artists_list']),
+            'tag': build_incidence_matrix(df['tags_list']),
+        }
+    return {
+        'ids': df['id'].to_numpy(),
+        'engagement_ratio': engagement_ratio,
+        'views_normalized': views_normalized,
+        'likes_normalized': likes_normalized,
+        'popularity_score': popularity_score,
+        'cold_start_score': cold_start_score,
+        'cold_start_order': np.argsort(-cold_start_score, kind='stable'),
+        'incidence': incidence,
+    }
@@ -0,0 +1,151 @@
+import os
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from dotenv import load_dotenv
+from array_store import save_version, current_version, open_version
+from feature_store import FEATURE_KINDS, get_catalog_version, load_catalog, sync_features
+from catalog_scores import compute_global_scores
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Get database path from environment variable
+DB_PATH = os.getenv("DB_PATH", "hot100.db")
+# Directory of the versioned, memory-mapped scored catalog written at ingest
+CATALOG_SNAPSHOT_DIR = os.getenv("CATALOG_SNAPSHOT_DIR", "data/catalog_snapshot")
+
+# Global score arrays stored as they are computed
+SCORE_ARRAYS = (
+    "engagement_ratio", "views_normalized", "likes_normalized",
+    "popularity_score", "cold_start_score", "cold_start_order",
+)
+
+# Process-wide snapshot, reopened when ingest writes a new version
+_snapshot = None
+_snapshot_version = None
+_lock = threading.Lock()
+
+# ------- Writing -------
+
+def write_snapshot(conn, base_dir=CATALOG_SNAPSHOT_DIR):
+    """Write the scoring catalog and its global scores as a new snapshot version.
+
+    Columns are plain .npy arrays: strings as fixed-width unicode, artists as
+    category codes, and the artist/tag incidence matrices as their CSR arrays.
+    """
+    # Catch up on songs removed or changed since the last sync, since load_catalog only reads
+    sync_features(conn)
+    catalog_version = get_catalog_version(conn)
+    df = load_catalog(conn)
+    global_scores = compute_global_scores(df)
+
+    artists = df['artist'].cat
+    arrays = {
+        "catalog_version": np.array(catalog_version, dtype=np.int64),
+        "ids": df['id'].to_numpy(dtype=str),
+        "song": df['song'].fillna("").to_numpy(dtype=str),
+        "artist_codes": artists.codes.to_numpy(dtype=np.int32),
+        "artist_categories": artists.categories.to_numpy(dtype=str),
+        # Frozen at ingest; see get_scoring_catalog
+        "count": df['count'].to_numpy(dtype=np.int32),
+    }
+    for col in ("views", "like_count"):
+        if col in df.columns:
+            arrays[col] = df[col].to_numpy(dtype=np.float32)
+    for name in SCORE_ARRAYS:
+        if global_scores[name] is not None:
+            arrays[name] = global_scores[name]
+    for kind, (matrix, vocab) in global_scores['incidence'].items():
+        arrays[f"{kind}_indptr"] = matrix.indptr
+        arrays[f"{kind}_indices"] = matrix.indices
+        arrays[f"{kind}_data"] = matrix.data
+        arrays[f"{kind}_vocab"] = np.array(list(vocab), dtype=str)
+
+    return save_version(base_dir, arrays)
+
+# ------- Reading -------
+
+def _token_lists(indptr, indices, data, names):
+    """Rebuild per-song token lists from an incidence matrix, repeating tokens by their count."""
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    repeats = data.astype(np.int64)
+    tokens = names[np.repeat(indices, repeats)]
+    bounds = np.searchsorted(np.repeat(rows, repeats), np.arange(len(indptr)))
+    return [tokens[start:end].tolist() for start, end in zip(bounds[:-1], bounds[1:])]
+
+def _open(base_dir, version):
+    """Memory-map a snapshot version and wrap it as a catalog DataFrame and global scores."""
+    arrays = open_version(base_dir, version)
+    n = len(arrays['ids'])
+
+    columns = {
+        'id': arrays['ids'],
+        'song': arrays['song'],
+        'artist': pd.Categorical.from_codes(arrays['artist_codes'], arrays['artist_categories']),
+        'count': arrays['count'],
+    }
+    for col in ("views", "like_count"):
+        if col in arrays:
+            columns[col] = arrays[col]
+    # Numeric columns keep pointing at the mapped files
+    df = pd.DataFrame(columns, copy=False)
+    df['song_idx'] = np.arange(n, dtype=np.int32)
+
+    incidence = {}
+    for kind, (list_col, _) in FEATURE_KINDS.items():
+        indptr, indices, data = arrays[f"{kind}_indptr"], arrays[f"{kind}_indices"], arrays[f"{kind}_data"]
+        vocab = arrays[f"{kind}_vocab"].tolist()
+        matrix = sparse.csr_matrix((data, indices, indptr), shape=(n, len(vocab)), copy=False)
+        incidence[kind] = (matrix, {token: col for col, token in enumerate(vocab)})
+        # Equal tokens share one string object, as in load_catalog
+        df[list_col] = _token_lists(indptr, indices, data, np.array(vocab, dtype=object))
+
+    global_scores = {name: arrays.get(name) for name in SCORE_ARRAYS}
+    global_scores['ids'] = df['id'].to_numpy()
+    global_scores['incidence'] = incidence
+    return {
+        'catalog_version': int(arrays['catalog_version']),
+        'catalog': df,
+        'global_scores': global_scores,
+    }
+
+def load_catalog_snapshot(base_dir=CATALOG_SNAPSHOT_DIR):
+    """Return the process-wide catalog snapshot, or None if ingest hasn't written one.
+
+    Every session of the process shares it; the score arrays and incidence
+    matrices are memory-mapped, so worker processes share the page cache too.
+    """
+    global _snapshot, _snapshot_version
+    version = current_version(base_dir)
+    if version is None:
+        return None
+
+    with _lock:
+        if _snapshot is None or _snapshot_version != version:
+            _snapshot = _open(base_dir, version)
+            _snapshot_version = version
+        return _snapshot
+
+def get_scoring_catalog(catalog_version, base_dir=CATALOG_SNAPSHOT_DIR):
+    """Get a per-request catalog and its global scores from the snapshot.
+
+    Returns (None, None) when there is no snapshot for catalog_version, so
+    the caller can fall back to loading the catalog from SQLite. The catalog
+    is a shallow copy: score columns added while ranking stay private to the
+    request, while the snapshot's columns are shared. Its 'count' column is
+    the local play count as of the last ingest; plays don't change the
+    catalog version, so the popularity used for anonymous scoring lags
+    until the next ingest rewrites the snapshot.
+    """
+    snapshot = load_catalog_snapshot(base_dir)
+    if snapshot is None or snapshot['catalog_version'] != catalog_version:
+        return None, None
+    return snapshot['catalog'].copy(deep=False), snapshot['global_scores']
+
+if __name__ == "__main__":
+    with sqlite3.connect(DB_PATH) as conn:
+        version = write_snapshot(conn)
+    print(f"Catalog snapshot written as version {version}")
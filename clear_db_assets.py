@@ -2,6 +2,7 @@ import os
 import shutil
 import sqlite3
 from dotenv import load_dotenv
+from feature_store import bump_catalog_version
 
 # Load environment variables
 load_dotenv()
@@ -32,6 +33,7 @@ def clear_database():
         cursor = conn.cursor()
         try:
             cursor.execute("DELETE FROM hot100")  # Clear all records
+            bump_catalog_version(conn)
             conn.commit()
             print("Database cleared successfully.")
         except sqlite3.Error as e:
@@ -40,8 +42,8 @@ def clear_database():
             conn.close()
 
 def clear_assets():
-    """Clear all files inside assets/meta, assets/imgs, and assets/music, and reset the database."""
-    directories = ["assets/meta", "assets/imgs", "assets/music"]
+    """Clear all files inside assets/meta, assets/imgs, assets/thumbs and assets/music, and reset the database."""
+    directories = ["assets/meta", "assets/imgs", "assets/thumbs", "assets/music"]
     
     for directory in directories:
         clear_directory(directory)
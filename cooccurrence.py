@@ -0,0 +1,163 @@
+import os
+import time
+import sqlite3
+from collections import Counter
+from dotenv import load_dotenv
+import firebase_config as fb
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Get database path from environment variable
+DB_PATH = os.getenv("DB_PATH", "hot100.db")
+# Most recent songs of a user that a new play is paired with
+COOC_HISTORY = 200
+# Neighbors read per recent play when scoring
+COOC_NEIGHBORS = 20
+# Recent plays whose neighbor rows are summed when scoring
+COOC_RECENT_PLAYS = 20
+
+def init_cooccurrence(conn):
+    """Create the play history and co-occurrence tables if they don't exist."""
+    cursor = conn.cursor()
+
+    # Distinct songs each user has played, with when they last played them
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_song_plays (
+            user_id TEXT,
+            song_id TEXT,
+            count INTEGER,
+            last_played INTEGER,
+            PRIMARY KEY (user_id, song_id)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_song_plays_recent ON user_song_plays (user_id, last_played)")
+
+    # Number of users who played both songs, stored in both directions.
+    # The diagonal (song_id = other_id) holds the number of users who played the song.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS song_cooccurrence (
+            song_id TEXT,
+            other_id TEXT,
+            count INTEGER,
+            PRIMARY KEY (song_id, other_id)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_song_cooccurrence_top ON song_cooccurrence (song_id, count)")
+    conn.commit()
+
+def _add_pairs(conn, song_id, other_ids):
+    """Count one more user for song_id with itself and with each other song, in both directions."""
+    rows = [(song_id, song_id)]
+    rows += [(song_id, other_id) for other_id in other_ids]
+    rows += [(other_id, song_id) for other_id in other_ids]
+    conn.executemany("""
+        INSERT INTO song_cooccurrence (song_id, other_id, count) VALUES (?, ?, 1)
+        ON CONFLICT(song_id, other_id) DO UPDATE SET count = count + 1
+    """, rows)
+
+def record_play(conn, user_id, song_id):
+    """Record one play and update the co-occurrence of the played song.
+
+    Only a user's first play of a song changes co-occurrence: the song's row
+    (and its mirrored entries) gains the user's recent songs, so the cost is
+    bounded by COOC_HISTORY and independent of the number of users. The
+    caller creates the tables once (init_cooccurrence), not on every play.
+    """
+    now = time.time_ns()
+    cursor = conn.execute("""
+        UPDATE user_song_plays SET count = count + 1, last_played = ?
+        WHERE user_id = ? AND song_id = ?
+    """, (now, user_id, song_id))
+
+    if cursor.rowcount == 0:
+        other_ids = [row[0] for row in conn.execute("""
+            SELECT song_id FROM user_song_plays WHERE user_id = ?
+            ORDER BY last_played DESC LIMIT ?
+        """, (user_id, COOC_HISTORY))]
+        _add_pairs(conn, song_id, other_ids)
+        conn.execute(
+            "INSERT INTO user_song_plays (user_id, song_id, count, last_played) VALUES (?, ?, 1, ?)",
+            (user_id, song_id, now)
+        )
+    conn.commit()
+
+def get_recent_songs(conn, user_id, n=COOC_RECENT_PLAYS):
+    """Get the user's n most recently played songs recorded in this database."""
+    init_cooccurrence(conn)
+    return [row[0] for row in conn.execute("""
+        SELECT song_id FROM user_song_plays WHERE user_id = ?
+        ORDER BY last_played DESC LIMIT ?
+    """, (user_id, n))]
+
+def get_neighbors(conn, song_id, k=COOC_NEIGHBORS):
+    """Get the k songs most often played by the same users as song_id, with P(other | song_id)."""
+    row = conn.execute(
+        "SELECT count FROM song_cooccurrence WHERE song_id = ? AND other_id = ?", (song_id, song_id)
+    ).fetchone()
+    if not row:
+        return []
+
+    listeners = row[0]
+    rows = conn.execute("""
+        SELECT other_id, count FROM song_cooccurrence WHERE song_id = ? AND other_id != ?
+        ORDER BY count DESC LIMIT ?
+    """, (song_id, song_id, k))
+    return [(other_id, count / listeners) for other_id, count in rows]
+
+def score_candidates(conn, song_ids, k=COOC_NEIGHBORS):
+    """Score candidate songs by summing the top-k neighbor rows of the given songs.
+
+    Costs O(len(song_ids) x k) index reads. Scores are averaged over the input
+    songs so they stay within [0, 1].
+    """
+    init_cooccurrence(conn)
+    scores = Counter()
+    for song_id in song_ids:
+        for other_id, score in get_neighbors(conn, song_id, k):
+            scores[other_id] += score
+    return {other_id: score / len(song_ids) for other_id, score in scores.items()} if song_ids else {}
+
+def _timestamp_ns(value):
+    """Convert a Firestore timestamp (or None) to integer nanoseconds for ordering."""
+    if value is None:
+        return 0
+    if hasattr(value, 'timestamp'):
+        return int(value.timestamp() * 1e9)
+    return int(value)
+
+def build_cooccurrence(conn, all_user_plays):
+    """Rebuild the play history and co-occurrence tables from every user's play data."""
+    init_cooccurrence(conn)
+    conn.execute("DELETE FROM user_song_plays")
+    conn.execute("DELETE FROM song_cooccurrence")
+
+    pairs = Counter()
+    for user_id, plays in all_user_plays.items():
+        played = [
+            (song_id, play_data.get('count', 0), play_data.get('last_played'))
+            for song_id, play_data in plays.items() if play_data.get('count', 0) > 0
+        ]
+        # Oldest first, so each song is paired with the songs played before it, as record_play does
+        played.sort(key=lambda play: _timestamp_ns(play[2]))
+        conn.executemany(
+            "INSERT INTO user_song_plays (user_id, song_id, count, last_played) VALUES (?, ?, ?, ?)",
+            [(user_id, song_id, count, _timestamp_ns(last_played)) for song_id, count, last_played in played]
+        )
+        for position, (song_id, _, _) in enumerate(played):
+            pairs[(song_id, song_id)] += 1
+            for other_id, _, _ in played[max(0, position - COOC_HISTORY):position]:
+                pairs[(song_id, other_id)] += 1
+                pairs[(other_id, song_id)] += 1
+
+    conn.executemany(
+        "INSERT INTO song_cooccurrence (song_id, other_id, count) VALUES (?, ?, ?)",
+        [(song_id, other_id, count) for (song_id, other_id), count in pairs.items()]
+    )
+    conn.commit()
+    return len(all_user_plays)
+
+if __name__ == "__main__":
+    with sqlite3.connect(DB_PATH) as conn:
+        users = build_cooccurrence(conn, fb.get_all_users_play_data(limit=None))
+    print(f"Co-occurrence rebuilt from {users} users")
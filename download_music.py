@@ -7,6 +7,10 @@ import time
 import shutil
 import base64
 from dotenv import load_dotenv
+from feature_store import sync_features, bump_catalog_version
+from similar_songs import update_song_neighbors
+from catalog_snapshot import write_snapshot
+from thumbnails import remove_thumbnails
 
 # Load environment variables from .env file
 load_dotenv()
@@ -177,7 +181,7 @@ def cleanup_failed_download(song_id):
     This removes:
     - Song entry from hot100 database
     - Metadata JSON file from assets/meta
-    - Artwork image from assets/imgs
+    - Artwork image from assets/imgs and its thumbnails from assets/thumbs
     - Any partially downloaded audio files from assets/music
     """
     print(f"Cleaning up assets for failed download with ID: {song_id}")
@@ -209,11 +213,18 @@ def cleanup_failed_download(song_id):
         except Exception as e:
             print(f"Error deleting image file: {e}")
     
+    # Remove artwork thumbnails
+    try:
+        remove_thumbnails(song_id)
+    except Exception as e:
+        print(f"Error deleting thumbnails: {e}")
+    
     # Remove database entry
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     try:
         cursor.execute("DELETE FROM hot100 WHERE id = ?", (song_id,))
+        bump_catalog_version(conn)
         conn.commit()
         if cursor.rowcount > 0:
             print(f"Removed database entry for ID: {song_id}")
@@ -299,33 +310,39 @@ def save_metadata(song_id, metadata):
 
     # Check and add missing columns
     try:
-    cursor.execute("PRAGMA table_info(hot100)")
-    existing_columns = {col[1] for col in cursor.fetchall()}
+        cursor.execute("PRAGMA table_info(hot100)")
+        existing_columns = {col[1] for col in cursor.fetchall()}
 
-    for column, col_type in columns_to_add.items():
-        if column not in existing_columns:
-            cursor.execute(f"ALTER TABLE hot100 ADD COLUMN {column} {col_type}")
-            print(f"Added column: {column}")
+        for column, col_type in columns_to_add.items():
+            if column not in existing_columns:
+                cursor.execute(f"ALTER TABLE hot100 ADD COLUMN {column} {col_type}")
+                print(f"Added column: {column}")
 
-    # Update metadata in the table
-    query = """
-    UPDATE hot100
-    SET youtube_url = ?, uploader = ?, duration = ?, views = ?, like_count = ?, 
-            release_date = ?, thumbnail = ?, tags = ?, description = ?, last_updated = ?
-    WHERE id = ?
-    """
-    cursor.execute(query, (
-        metadata["url"], metadata["uploader"], metadata["duration"], metadata["views"],
-        metadata["like_count"], metadata["release_date"], metadata["thumbnails"],
-            json.dumps(metadata["tags"]), metadata.get("description", ""), 
-            metadata["last_updated"], song_id
-    ))
+        # Update metadata in the table
+        query = """
+        UPDATE hot100
+        SET youtube_url = ?, uploader = ?, duration = ?, views = ?, like_count = ?, 
+                release_date = ?, thumbnail = ?, tags = ?, description = ?, last_updated = ?
+        WHERE id = ?
+        """
+        cursor.execute(query, (
+            metadata["url"], metadata["uploader"], metadata["duration"], metadata["views"],
+            metadata["like_count"], metadata["release_date"], metadata["thumbnails"],
+                json.dumps(metadata["tags"]), metadata.get("description", ""), 
+                metadata["last_updated"], song_id
+        ))
+        bump_catalog_version(conn)
 
-    conn.commit()
+        conn.commit()
+        
+        # Reparse the artist/tag features for this song's new last_updated
+        sync_features(conn)
+        # Refresh this song's "more like this" neighbors
+        update_song_neighbors(conn, song_id)
     except sqlite3.Error as e:
         print(f"Database error: {e}")
     finally:
-    conn.close()
+        conn.close()
     
     # Update JSON metadata file
     json_path = os.path.join("assets", "meta", f"{song_id}.json")
@@ -352,9 +369,11 @@ def save_metadata(song_id, metadata):
             "last_updated": metadata["last_updated"]
         })
         
-        # Write updated JSON back to file
-        with open(json_path, "w", encoding="utf-8") as f:
+        # Write updated JSON back to file through a rename, which the library index notices as a directory change
+        tmp_path = f"{json_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
             json.dump(json_data, f, indent=4)
+        os.replace(tmp_path, json_path)
         
         print(f"Updated metadata JSON file: {json_path}")
     except Exception as e:
@@ -447,7 +466,7 @@ def process_songs():
         
         if "Failed to download" in result:
             failed_count += 1
-        results.append(f"ID: {song_id} | {artist_name} - {song_name}\n{result}\n")
+            results.append(f"ID: {song_id} | {artist_name} - {song_name}\n{result}\n")
             continue
         
         # If download was successful
@@ -456,7 +475,7 @@ def process_songs():
         # Save metadata
         print("Saving metadata")
         try:
-        save_metadata(song_id=song_id, metadata=metadata)
+            save_metadata(song_id=song_id, metadata=metadata)
             updated_metadata_count += 1
         except Exception as e:
             print(f"Error saving metadata: {e}")
@@ -475,6 +494,13 @@ def process_songs():
     summary += f"  - Skipped {skipped_count} songs (already up to date)\n"
     summary += f"  - Failed and cleaned up {failed_count} songs\n"
     
+    # Publish the updated metadata to the app's memory-mapped catalog snapshot
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        summary += f"  - Catalog snapshot version {write_snapshot(conn)}\n"
+    finally:
+        conn.close()
+    
     return "\n".join(results) + summary
 
 def main():
@@ -0,0 +1,279 @@
+import os
+import re
+import json
+import sqlite3
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Get database path from environment variable
+DB_PATH = os.getenv("DB_PATH", "hot100.db")
+
+# Token kinds stored in the feature store and the DataFrame columns they fill
+FEATURE_KINDS = {
+    "artist": ("artists_list", "artist_ids"),
+    "tag": ("tags_list", "tag_ids"),
+}
+
+# hot100 columns used for scoring; descriptions, thumbnails and URLs stay in SQLite
+CATALOG_COLUMNS = ["id", "song", "artist", "count", "views", "like_count"]
+
+# ------- Parsing -------
+
+def process_artists(artist_str):
+    """Split artist names that contain featuring, with, &, etc."""
+    if isinstance(artist_str, str):
+        # Replace "Featuring" and other variants
+        artist_str = re.sub(r'Featuring|Feat\.|Feat|ft\.', '&', artist_str)
+        # Split by & or "with"
+        artists = re.split(r'\s*&\s*|\s+with\s+', artist_str)
+        # Strip whitespace
+        return [artist.strip() for artist in artists]
+    return []
+
+def process_tags(tags_str):
+    """Process tags from JSON string to list."""
+    if isinstance(tags_str, str):
+        try:
+            # Parse JSON string
+            tags = json.loads(tags_str)
+            # Extract and clean tags
+            return [tag.lower().strip() for tag in tags]
+        except json.JSONDecodeError:
+            return []
+    return []
+
+# ------- Catalog Version -------
+
+def init_catalog_meta(conn):
+    """Create the catalog metadata table if it doesn't exist."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS catalog_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER
+        )
+    """)
+
+def get_catalog_version(conn):
+    """Get the catalog version, bumped whenever songs or their metadata change."""
+    init_catalog_meta(conn)
+    row = conn.execute("SELECT value FROM catalog_meta WHERE key = 'catalog_version'").fetchone()
+    return row[0] if row else 0
+
+def bump_catalog_version(conn):
+    """Increment the catalog version so cached recommendations are recomputed.
+
+    The caller is responsible for committing.
+    """
+    init_catalog_meta(conn)
+    conn.execute("""
+        INSERT INTO catalog_meta (key, value) VALUES ('catalog_version', 1)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1
+    """)
+
+# ------- Storage -------
+
+def init_feature_store(conn):
+    """Create the feature store tables if they don't exist."""
+    cursor = conn.cursor()
+
+    # One row per parsed song, keyed by the last_updated value it was parsed from
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS song_features (
+            id TEXT PRIMARY KEY,
+            last_updated INTEGER
+        )
+    """)
+
+    # Integer encoding for artist and tag tokens, stable across runs
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS feature_vocab (
+            kind TEXT,
+            token TEXT,
+            token_id INTEGER,
+            PRIMARY KEY (kind, token)
+        )
+    """)
+
+    # Parsed token lists, one row per token occurrence
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS song_feature_tokens (
+            id TEXT,
+            kind TEXT,
+            position INTEGER,
+            token_id INTEGER
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_song_feature_tokens_id ON song_feature_tokens (id)")
+    # Songs sharing a token, for incremental "more like this" updates
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_song_feature_tokens_token ON song_feature_tokens (kind, token_id)")
+    # Token lookups by id when decoding stored features
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_feature_vocab_token_id ON feature_vocab (kind, token_id)")
+    conn.commit()
+
+def load_vocab(conn):
+    """Load the token encoding as {kind: {token: token_id}}."""
+    vocab = {kind: {} for kind in FEATURE_KINDS}
+    for kind, token, token_id in conn.execute("SELECT kind, token, token_id FROM feature_vocab"):
+        vocab.setdefault(kind, {})[token] = token_id
+    return vocab
+
+def _encode(conn, vocab, kind, tokens):
+    """Map tokens to integer ids, registering unseen tokens in the vocabulary."""
+    ids = []
+    kind_vocab = vocab[kind]
+    for token in tokens:
+        if token not in kind_vocab:
+            kind_vocab[token] = len(kind_vocab)
+            conn.execute(
+                "INSERT INTO feature_vocab (kind, token, token_id) VALUES (?, ?, ?)",
+                (kind, token, kind_vocab[token])
+            )
+        ids.append(kind_vocab[token])
+    return ids
+
+def sync_features(conn):
+    """Reparse artist/tag features for songs that are new or whose last_updated changed."""
+    init_feature_store(conn)
+
+    # Older databases may not have the metadata columns yet
+    columns = {col[1] for col in conn.execute("PRAGMA table_info(hot100)").fetchall()}
+    tags_col = "h.tags" if "tags" in columns else "NULL"
+    updated_col = "h.last_updated" if "last_updated" in columns else "NULL"
+
+    stale = conn.execute(f"""
+        SELECT h.id, h.artist, {tags_col}, {updated_col}
+        FROM hot100 h LEFT JOIN song_features f ON f.id = h.id
+        WHERE f.id IS NULL OR f.last_updated IS NOT {updated_col}
+    """).fetchall()
+
+    if stale:
+        vocab = load_vocab(conn)
+        for song_id, artist, tags, last_updated in stale:
+            conn.execute("DELETE FROM song_feature_tokens WHERE id = ?", (song_id,))
+
+            rows = []
+            for kind, tokens in (("artist", process_artists(artist)), ("tag", process_tags(tags))):
+                for position, token_id in enumerate(_encode(conn, vocab, kind, tokens)):
+                    rows.append((song_id, kind, position, token_id))
+            conn.executemany(
+                "INSERT INTO song_feature_tokens (id, kind, position, token_id) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO song_features (id, last_updated) VALUES (?, ?)",
+                (song_id, last_updated)
+            )
+
+    # Drop features for songs that were removed from the catalog
+    conn.execute("DELETE FROM song_feature_tokens WHERE id NOT IN (SELECT id FROM hot100)")
+    conn.execute("DELETE FROM song_features WHERE id NOT IN (SELECT id FROM hot100)")
+    conn.commit()
+
+    return len(stale)
+
+def load_features(conn):
+    """Load parsed artist/tag lists and their integer ids for every song in the store."""
+    init_feature_store(conn)
+
+    features = pd.read_sql("SELECT id FROM song_features", conn).set_index('id')
+    tokens = pd.read_sql("""
+        SELECT t.id, t.kind, t.token_id, v.token
+        FROM song_feature_tokens t
+        JOIN feature_vocab v ON v.kind = t.kind AND v.token_id = t.token_id
+        ORDER BY t.id, t.kind, t.position
+    """, conn)
+
+    for kind, (list_col, ids_col) in FEATURE_KINDS.items():
+        grouped = tokens[tokens['kind'] == kind].groupby('id', sort=False)
+        features[list_col] = grouped['token'].agg(list)
+        features[ids_col] = grouped['token_id'].agg(list)
+        # Songs without any tokens of this kind get empty lists
+        for col in (list_col, ids_col):
+            features[col] = features[col].apply(lambda v: v if isinstance(v, list) else [])
+
+    return features.reset_index()
+
+def get_song_features(conn, song_id):
+    """Load the parsed artist and tag lists of a single song.
+
+    The caller creates the tables once (init_feature_store), not per lookup.
+    """
+    song_features = {list_col: [] for list_col, _ in FEATURE_KINDS.values()}
+    rows = conn.execute("""
+        SELECT t.kind, v.token
+        FROM song_feature_tokens t
+        JOIN feature_vocab v ON v.kind = t.kind AND v.token_id = t.token_id
+        WHERE t.id = ?
+        ORDER BY t.kind, t.position
+    """, (song_id,))
+    for kind, token in rows:
+        song_features[FEATURE_KINDS[kind][0]].append(token)
+    return song_features
+
+def attach_features(df, conn):
+    """Join the ready-made features onto a hot100 DataFrame.
+
+    Read-only: the ingest scripts keep the store in sync with hot100.
+    """
+    features = load_features(conn)
+    df = df.merge(features, on='id', how='left')
+
+    for list_col, ids_col in FEATURE_KINDS.values():
+        for col in (list_col, ids_col):
+            df[col] = df[col].apply(lambda v: v if isinstance(v, list) else [])
+
+    return df
+
+# ------- Compact Catalog -------
+
+def load_catalog(conn):
+    """Load the hot100 catalog in a compact form for scoring.
+
+    Only CATALOG_COLUMNS are read. Songs get int32 surrogate ids (song_idx)
+    in catalog order, artists are categorical, views/likes are float32, and
+    the token lists share one string object per vocabulary token.
+
+    Read-only: the ingest scripts run sync_features whenever hot100 changes,
+    so loading on a request path never writes to the shared database.
+    """
+    init_feature_store(conn)
+
+    # Older databases may not have the metadata columns yet
+    columns = {col[1] for col in conn.execute("PRAGMA table_info(hot100)").fetchall()}
+    df = pd.read_sql(f"SELECT {', '.join(c for c in CATALOG_COLUMNS if c in columns)} FROM hot100", conn)
+    df['song_idx'] = np.arange(len(df), dtype=np.int32)
+    df['artist'] = df['artist'].astype('category')
+    df['count'] = df['count'].fillna(0).astype(np.int32)
+    for col in ('views', 'like_count'):
+        if col in df.columns:
+            df[col] = df[col].astype(np.float32)
+
+    tokens = pd.read_sql("SELECT id, kind, position, token_id FROM song_feature_tokens", conn)
+    tokens['song_idx'] = pd.Index(df['id']).get_indexer(tokens['id'])
+    tokens = tokens[tokens['song_idx'] >= 0].sort_values(['song_idx', 'position'])
+
+    vocab = load_vocab(conn)
+    for kind, (list_col, _) in FEATURE_KINDS.items():
+        # token_id -> token string, so equal tokens are the same object in every list
+        kind_vocab = vocab[kind]
+        names = np.empty(len(kind_vocab), dtype=object)
+        names[list(kind_vocab.values())] = list(kind_vocab.keys())
+
+        kind_tokens = tokens[tokens['kind'] == kind]
+        song_idx = kind_tokens['song_idx'].to_numpy()
+        token_ids = kind_tokens['token_id'].to_numpy()
+        bounds = np.searchsorted(song_idx, np.arange(len(df) + 1))
+        df[list_col] = [
+            names[token_ids[start:end]].tolist() for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+
+    return df
+
+if __name__ == "__main__":
+    with sqlite3.connect(DB_PATH) as conn:
+        reparsed = sync_features(conn)
+    print(f"Feature store synced: {reparsed} songs reparsed")
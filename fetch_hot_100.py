@@ -5,6 +5,9 @@ import uuid
 import sqlite3
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
+from feature_store import sync_features, bump_catalog_version
+from catalog_snapshot import write_snapshot
+from thumbnails import generate_thumbnails
 
 # Load environment variables
 load_dotenv()
@@ -59,6 +62,7 @@ def save_to_db(unique_id, artist, song):
     cursor = conn.cursor()
     try:
         cursor.execute("INSERT INTO hot100 (id, artist, song, count) VALUES (?, ?, ?, ?)", (unique_id, artist, song, 0))
+        bump_catalog_version(conn)
         conn.commit()
     except sqlite3.IntegrityError:
         pass  # Skip duplicates
@@ -146,6 +150,19 @@ def fetch_hot_100(limit=10):
     print(f"\nSummary: Found {count} songs in Hot 100")
     print(f"  - {new_songs} new songs added to database")
     print(f"  - {updated_songs} existing songs updated")
+    
+    # Parse artist/tag features for the new songs
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        reparsed = sync_features(conn)
+        print(f"  - {reparsed} songs added to the feature store")
+        # Resize the new album art for the UI
+        generated, failed = generate_thumbnails(conn)
+        print(f"  - Thumbnails generated for {generated} images ({failed} failed)")
+        # Publish the updated catalog to the app's memory-mapped snapshot
+        print(f"  - Catalog snapshot version {write_snapshot(conn)}")
+    finally:
+        conn.close()
 
 if __name__ == "__main__":
     init_db()  # Initialize the database
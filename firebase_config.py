@@ -4,7 +4,10 @@ import pyrebase
 import streamlit as st
 import os
 import json
+from collections import Counter
+from google.api_core.exceptions import NotFound
 from dotenv import load_dotenv
+import read_pool
 
 # Load environment variables from .env file
 load_dotenv()
@@ -134,19 +137,70 @@ def update_play_count(user_id, song_id, artist, song_name):
         'total_plays': firestore.Increment(1)
     })
 
+def get_affinity_profile(user_id):
+    """Get the user's artist/tag affinity profile, or None if it hasn't been built yet."""
+    doc = db.collection('users').document(user_id).collection('profile').document('affinity').get()
+    return doc.to_dict() if doc.exists else None
+
+def set_affinity_profile(user_id, profile):
+    """Store a complete artist/tag affinity profile for the user."""
+    db.collection('users').document(user_id).collection('profile').document('affinity').set(profile)
+
+def update_affinity_profile(user_id, artists, tags):
+    """Add one play of a song with the given artists and tags to the user's affinity profile."""
+    profile_ref = db.collection('users').document(user_id).collection('profile').document('affinity')
+    
+    artist_counts = Counter(artist for artist in artists if artist)
+    tag_counts = Counter(tag for tag in tags if tag)
+    updates = {
+        'artist_total': firestore.Increment(sum(artist_counts.values())),
+        'tag_total': firestore.Increment(sum(tag_counts.values()))
+    }
+    # Field paths are quoted so names containing dots or spaces stay a single key
+    for field, counts in (('artists', artist_counts), ('tags', tag_counts)):
+        for token, count in counts.items():
+            updates[firestore.FieldPath(field, token).to_api_repr()] = firestore.Increment(count)
+    
+    try:
+        profile_ref.update(updates)
+    except NotFound:
+        # No profile yet; it is built from the full play history on the next refresh
+        pass
+
 def get_user_play_counts(user_id):
     """Get all play counts for a specific user."""
     plays = db.collection('users').document(user_id).collection('plays').get()
     return {doc.id: doc.to_dict() for doc in plays if doc.id != 'info'}
 
-def get_all_users_play_data(limit=50):
-    """Get play data across all users (for collaborative filtering)"""
-    users = db.collection('users').limit(limit).get()
-    all_plays = {}
+def get_all_users_play_data(limit=50, deadline=None):
+    """Get play data across all users (for collaborative filtering). limit=None reads every user.
+    
+    Each user's plays are read concurrently on the shared read pool. With a
+    deadline (see read_pool.deadline_after), users whose plays aren't read
+    in time are left out.
+    """
+    plays, _ = read_all_users_play_data(limit=limit, deadline=deadline)
+    return plays
+
+def list_user_ids(limit=50):
+    """Get the ids of up to limit users. limit=None lists every user."""
+    users_ref = db.collection('users')
+    if limit is not None:
+        users_ref = users_ref.limit(limit)
+    return [user.id for user in users_ref.get()]
+
+def read_all_users_play_data(limit=50, deadline=None, exclude=()):
+    """Like get_all_users_play_data, but also return whether every user's plays were read.
     
-    for user in users:
-        user_id = user.id
-        plays = get_user_play_counts(user_id)
-        all_plays[user_id] = plays
+    The user listing runs on the read pool under the same deadline, so the
+    plays are read in whatever time the listing leaves. Users in exclude,
+    whose plays the caller reads itself, are left out.
+    """
+    listed, missing = read_pool.gather({'users': read_pool.submit(list_user_ids, limit)}, deadline)
+    if missing:
+        return {}, False
     
-    return all_plays 
\ No newline at end of file
+    futures = {user_id: read_pool.submit(get_user_play_counts, user_id) for user_id in listed['users']
+               if user_id not in exclude}
+    plays, missing = read_pool.gather(futures, deadline)
+    return plays, not missing
@@ -0,0 +1,88 @@
+import re
+import heapq
+import threading
+from bisect import bisect_left, bisect_right
+import numpy as np
+
+# Fields indexed for lookup and the DataFrame column holding their token lists
+INDEXED_FIELDS = {
+    "artist": "artists_list",
+    "tag": "tags_list",
+}
+
+# Process-wide index, rebuilt when the catalog version changes
+_cached_index = None
+_cached_version = None
+_lock = threading.Lock()
+
+def normalize_text(text):
+    """Lowercase text and collapse whitespace so lookups ignore case and spacing."""
+    return re.sub(r'\s+', ' ', str(text)).strip().lower()
+
+def _index_keys(token):
+    """Keys a token is indexed under: its full normalized form and each of its words."""
+    normalized = normalize_text(token)
+    if not normalized:
+        return []
+    return [normalized] + [word for word in normalized.split(' ') if word != normalized]
+
+def build_inverted_index(scored_df):
+    """Build artist->songs and tag->songs postings over a scored catalog.
+
+    Songs are stored in descending recommendation_score order, and postings
+    hold those ranks, so every posting list is already sorted by score.
+    """
+    order = np.argsort(-scored_df['recommendation_score'].to_numpy(), kind='stable')
+    songs = scored_df.iloc[order].reset_index(drop=True)
+
+    postings = {}
+    for field, column in INDEXED_FIELDS.items():
+        field_postings = {}
+        for rank, tokens in enumerate(songs[column]):
+            for token in tokens:
+                for key in _index_keys(token):
+                    posting = field_postings.setdefault(key, [])
+                    # A song is listed once per key even if several of its tokens share it
+                    if not posting or posting[-1] != rank:
+                        posting.append(rank)
+        postings[field] = field_postings
+
+    return {
+        'songs': songs,
+        'postings': postings,
+        # Sorted keys for prefix range lookups
+        'keys': {field: sorted(field_postings) for field, field_postings in postings.items()},
+    }
+
+def lookup(index, field, query, n=3, prefix=True):
+    """Return the top-n songs whose field has a token matching the query, best score first.
+
+    With prefix=True any indexed key starting with the normalized query matches.
+    """
+    token = normalize_text(query)
+    field_postings = index['postings'][field]
+
+    if prefix:
+        keys = index['keys'][field]
+        matching = keys[bisect_left(keys, token):bisect_right(keys, token + '\uffff')]
+    else:
+        matching = [token] if token in field_postings else []
+
+    # Merge the score-ordered posting lists, stopping once n distinct songs are found
+    ranks = []
+    for rank in heapq.merge(*(field_postings[key] for key in matching)):
+        if not ranks or ranks[-1] != rank:
+            ranks.append(rank)
+            if len(ranks) >= n:
+                break
+
+    return index['songs'].iloc[ranks]
+
+def get_cached_index(catalog_version, build):
+    """Return the process-wide index for the catalog version, calling build() when it changed."""
+    global _cached_index, _cached_version
+    with _lock:
+        if _cached_index is None or _cached_version != catalog_version:
+            _cached_index = build()
+            _cached_version = catalog_version
+        return _cached_index
@@ -0,0 +1,186 @@
+import os
+import time
+import argparse
+import threading
+import numpy as np
+from dotenv import load_dotenv
+import firebase_config as fb
+from array_store import POINTER_FILE, save_version, current_version, open_version
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Directory holding one subdirectory per trained model and a CURRENT pointer to the live one
+ITEM2VEC_DIR = os.getenv("ITEM2VEC_DIR", "data/item2vec")
+# Embedding size
+ITEM2VEC_DIMENSIONS = 64
+# Songs within this many positions of each other in a play sequence are treated as context
+ITEM2VEC_WINDOW = 20
+# Training passes over the play sequences
+ITEM2VEC_EPOCHS = 10
+# Songs played by fewer users than this get no embedding
+ITEM2VEC_MIN_COUNT = 2
+# Inverted lists probed per lookup; more probes are slower but closer to exact
+ITEM2VEC_PROBES = 8
+# Seconds between checks for a newly trained model
+ITEM2VEC_REFRESH_INTERVAL = float(os.getenv("ITEM2VEC_REFRESH_INTERVAL", 5))
+
+# Arrays making up a trained model
+MODEL_ARRAYS = ("ids", "vectors", "centroids", "rows", "offsets")
+
+# Process-wide memory-mapped model, reloaded when a new version is trained
+_model = None
+_model_version = None
+_model_dir = None
+_pointer_mtime = None  # modification time of the CURRENT pointer at the last check
+_checked_at = 0.0
+_lock = threading.Lock()
+
+# ------- Training -------
+
+def _timestamp(value):
+    """Convert a Firestore timestamp (or None) to seconds for ordering."""
+    if value is None:
+        return 0
+    return value.timestamp() if hasattr(value, 'timestamp') else float(value)
+
+def play_sequences(all_user_plays):
+    """Turn each user's plays into a sequence of song ids in first-played order."""
+    sequences = []
+    for plays in all_user_plays.values():
+        played = [
+            (song_id, play_data.get('first_played') or play_data.get('last_played'))
+            for song_id, play_data in plays.items() if play_data.get('count', 0) > 0
+        ]
+        if len(played) > 1:
+            played.sort(key=lambda play: _timestamp(play[1]))
+            sequences.append([song_id for song_id, _ in played])
+    return sequences
+
+def train_embeddings(sequences, dimensions=ITEM2VEC_DIMENSIONS, window=ITEM2VEC_WINDOW,
+                     epochs=ITEM2VEC_EPOCHS, min_count=ITEM2VEC_MIN_COUNT, workers=None, seed=0):
+    """Train skip-gram Word2Vec over play sequences and return song ids with L2-normalized vectors."""
+    # Imported here so app processes, which only look up neighbors, don't load gensim
+    from gensim.models import Word2Vec
+
+    model = Word2Vec(
+        sentences=sequences,
+        vector_size=dimensions,
+        window=window,
+        min_count=min_count,
+        sg=1,
+        negative=10,
+        epochs=epochs,
+        workers=workers or os.cpu_count() or 1,
+        seed=seed,
+    )
+    vectors = model.wv.vectors.astype(np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return np.array(model.wv.index_to_key, dtype=str), vectors
+
+def build_ivf_index(vectors, n_lists=None, seed=0):
+    """Cluster vectors with k-means into inverted lists for approximate nearest neighbor search.
+
+    Returns the centroids, the vector rows grouped by list, and each list's
+    start offset into those rows.
+    """
+    # Only needed offline, like gensim above
+    from sklearn.cluster import MiniBatchKMeans
+
+    n_lists = n_lists or max(1, int(np.sqrt(len(vectors))))
+    kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=seed, n_init=3).fit(vectors)
+    assignments = kmeans.labels_
+    rows = np.argsort(assignments, kind='stable').astype(np.int32)
+    offsets = np.searchsorted(assignments[rows], np.arange(n_lists + 1)).astype(np.int64)
+    return kmeans.cluster_centers_.astype(np.float32), rows, offsets
+
+def save_model(base_dir, ids, vectors, centroids, rows, offsets):
+    """Write a model as a new version of the store and make it the live one."""
+    return save_version(base_dir, {
+        "ids": ids, "vectors": vectors, "centroids": centroids, "rows": rows, "offsets": offsets
+    })
+
+# ------- Lookup -------
+
+def load_model(base_dir=ITEM2VEC_DIR):
+    """Return the process-wide memory-mapped model, or None if none has been trained.
+
+    Arrays are opened read-only with mmap, so every worker process shares the
+    same page cache instead of holding its own copy. The CURRENT pointer is
+    checked at most every ITEM2VEC_REFRESH_INTERVAL seconds and only reread
+    when it was replaced, so reruns in between cost nothing on the filesystem.
+    """
+    global _model, _model_version, _model_dir, _pointer_mtime, _checked_at
+    with _lock:
+        now = time.monotonic()
+        if base_dir == _model_dir and now - _checked_at < ITEM2VEC_REFRESH_INTERVAL:
+            return _model
+        _checked_at = now
+
+        try:
+            mtime = os.stat(os.path.join(base_dir, POINTER_FILE)).st_mtime_ns
+        except OSError:
+            mtime = None
+        if base_dir == _model_dir and mtime == _pointer_mtime:
+            return _model
+        _model_dir, _pointer_mtime = base_dir, mtime
+
+        version = current_version(base_dir) if mtime is not None else None
+        if version is None:
+            _model = _model_version = None
+        elif _model is None or _model_version != version:
+            arrays = open_version(base_dir, version, MODEL_ARRAYS)
+            arrays['index'] = {song_id: row for row, song_id in enumerate(arrays['ids'].tolist())}
+            _model = arrays
+            _model_version = version
+        return _model
+
+def search(model, query, k=10, n_probe=ITEM2VEC_PROBES):
+    """Approximate top-k rows by cosine similarity to a normalized query vector."""
+    centroid_scores = model['centroids'] @ query
+    probed = np.argpartition(-centroid_scores, min(n_probe, len(centroid_scores)) - 1)[:n_probe]
+    offsets = model['offsets']
+    candidates = np.concatenate([model['rows'][offsets[i]:offsets[i + 1]] for i in probed])
+
+    scores = model['vectors'][candidates] @ query
+    top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k] if len(scores) > k else np.arange(len(scores))
+    top = top[np.argsort(-scores[top], kind='stable')]
+    return candidates[top], scores[top]
+
+def get_also_played(model, song_id, k=10, n_probe=ITEM2VEC_PROBES):
+    """Get songs that users who played song_id also played, as (song_id, similarity) pairs."""
+    row = model['index'].get(song_id)
+    if row is None:
+        return []
+
+    rows, scores = search(model, np.asarray(model['vectors'][row]), k + 1, n_probe)
+    ids = model['ids']
+    return [(str(ids[r]), float(score)) for r, score in zip(rows, scores) if r != row][:k]
+
+# ------- Training Command -------
+
+def main():
+    parser = argparse.ArgumentParser(description="Train item2vec song embeddings from every user's plays.")
+    parser.add_argument("--dimensions", type=int, default=ITEM2VEC_DIMENSIONS, help="embedding size")
+    parser.add_argument("--window", type=int, default=ITEM2VEC_WINDOW, help="context window in songs")
+    parser.add_argument("--epochs", type=int, default=ITEM2VEC_EPOCHS, help="training passes")
+    parser.add_argument("--min-count", type=int, default=ITEM2VEC_MIN_COUNT, help="minimum plays per song")
+    parser.add_argument("--lists", type=int, default=None, help="inverted lists in the ANN index (default: sqrt of songs)")
+    parser.add_argument("--user-limit", type=int, default=None, help="maximum number of users to train on")
+    parser.add_argument("--output", default=ITEM2VEC_DIR, help="model directory")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    sequences = play_sequences(fb.get_all_users_play_data(limit=args.user_limit))
+    print(f"Training on {len(sequences)} play sequences")
+
+    ids, vectors = train_embeddings(sequences, args.dimensions, args.window, args.epochs, args.min_count)
+    if len(ids) == 0:
+        print("No songs were played by enough users to train embeddings")
+        return
+    centroids, rows, offsets = build_ivf_index(vectors, args.lists)
+    version = save_model(args.output, ids, vectors, centroids, rows, offsets)
+    print(f"Saved {len(ids)} song embeddings as version {version} in {time.time() - start_time:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import threading
+from dotenv import load_dotenv
+from thumbnails import THUMB_DIR, thumbnail_name
+
+# Load environment variables from .env file
+load_dotenv()
+
+META_DIR = "assets/meta"
+IMG_DIR = "assets/imgs"
+MUSIC_DIR = "assets/music"
+DEFAULT_IMG = "assets/default.jpg"
+# Seconds between checks of the asset directories; reruns in between don't touch the filesystem
+LIBRARY_REFRESH_INTERVAL = float(os.getenv("LIBRARY_REFRESH_INTERVAL", 5))
+
+# Fields a library search can be limited to
+SEARCH_FIELDS = ("title", "artist", "tag")
+# Distinct searches kept between rescans
+SEARCH_CACHE_SIZE = 256
+
+# Process-wide library shared by every session
+_records = []  # playable songs in directory order
+_records_by_id = {}
+_dir_mtimes = None  # modification times of the asset directories at the last scan
+_meta_cache = {}  # metadata file name -> (mtime_ns, (title, artist, tags) or None if unreadable)
+_search_keys = []  # lowercased (title, artist, tags) of each record, in record order
+_search_cache = {}  # (query, field) -> matching records, cleared on every rescan
+_checked_at = 0.0
+_lock = threading.Lock()
+
+def _get_dir_mtimes():
+    """Modification times of the asset directories, which change whenever files are added or removed."""
+    mtimes = []
+    for directory in (META_DIR, IMG_DIR, MUSIC_DIR, THUMB_DIR):
+        try:
+            mtimes.append(os.stat(directory).st_mtime_ns)
+        except OSError:
+            mtimes.append(None)
+    return tuple(mtimes)
+
+def _list_files(directory, extension):
+    """Song ids of the files with the given extension in a directory."""
+    if not os.path.exists(directory):
+        return set()
+    return {entry.name[:-len(extension)] for entry in os.scandir(directory) if entry.name.endswith(extension)}
+
+def _read_meta(entry):
+    """Title, artist and tags from a metadata file, re-read only when the file changed since the last scan."""
+    mtime = entry.stat().st_mtime_ns
+    cached = _meta_cache.get(entry.name)
+    # Unreadable files are retried, since the fetcher may still have been writing them
+    if cached and cached[0] == mtime and cached[1] is not None:
+        return cached[1]
+
+    try:
+        with open(entry.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        meta = (data.get("song"), data.get("artist"), tuple(data.get("tags") or ()))
+    except Exception as e:
+        print(f"Error loading song metadata for {entry.name}: {e}")
+        meta = None
+    _meta_cache[entry.name] = (mtime, meta)
+    return meta
+
+def _image_path(song_id, thumb_ids, image_ids):
+    """The song's thumbnail, its full-size album art until one is generated, or the default image."""
+    if song_id in thumb_ids:
+        return os.path.join(THUMB_DIR, thumbnail_name(song_id))
+    if song_id in image_ids:
+        return os.path.join(IMG_DIR, f"{song_id}.jpg")
+    # Use default image if the specific one doesn't exist
+    return DEFAULT_IMG
+
+def _scan():
+    """Rebuild the library from the asset directories."""
+    global _records, _records_by_id, _search_keys
+    audio_ids = _list_files(MUSIC_DIR, ".mp3")
+    image_ids = _list_files(IMG_DIR, ".jpg")
+    thumb_ids = _list_files(THUMB_DIR, thumbnail_name(""))
+
+    records = []
+    search_keys = []
+    seen = set()
+    for entry in os.scandir(META_DIR) if os.path.exists(META_DIR) else []:
+        if not entry.name.endswith(".json"):
+            continue
+        seen.add(entry.name)
+        song_id = entry.name.split(".")[0]
+        # Only songs whose audio has been downloaded are playable
+        if song_id not in audio_ids:
+            continue
+        meta = _read_meta(entry)
+        if meta is None:
+            continue
+
+        records.append({
+            "id": song_id,
+            "title": meta[0],
+            "artist": meta[1],
+            "image": _image_path(song_id, thumb_ids, image_ids),
+            "audio": os.path.join(MUSIC_DIR, f"{song_id}.mp3"),
+        })
+        search_keys.append((
+            (meta[0] or "").lower(),
+            (meta[1] or "").lower(),
+            tuple(str(tag).lower() for tag in meta[2]),
+        ))
+
+    # Forget metadata files that were deleted
+    for name in set(_meta_cache) - seen:
+        del _meta_cache[name]
+    _records = records
+    _records_by_id = {record["id"]: record for record in records}
+    _search_keys = search_keys
+    _search_cache.clear()
+
+def refresh(force=False):
+    """Rescan the asset directories if they changed, checking at most every LIBRARY_REFRESH_INTERVAL seconds."""
+    global _dir_mtimes, _checked_at
+    with _lock:
+        now = time.monotonic()
+        if not force and _dir_mtimes is not None and now - _checked_at < LIBRARY_REFRESH_INTERVAL:
+            return
+        _checked_at = now
+
+        mtimes = _get_dir_mtimes()
+        if force or mtimes != _dir_mtimes:
+            _scan()
+            _dir_mtimes = mtimes
+
+def get_records():
+    """Every playable song as a record dict (id, title, artist, image, audio). Don't modify them."""
+    refresh()
+    return _records
+
+def get_record(song_id):
+    """The record of a playable song, or None."""
+    refresh()
+    return _records_by_id.get(song_id)
+
+def _matches(key, terms, field):
+    """Whether every term occurs in the given field of a search key, or in any field if field is None."""
+    title, artist, tags = key
+    for term in terms:
+        in_title = field in (None, "title") and term in title
+        in_artist = field in (None, "artist") and term in artist
+        in_tags = field in (None, "tag") and any(term in tag for tag in tags)
+        if not (in_title or in_artist or in_tags):
+            return False
+    return True
+
+def search(query, field=None):
+    """Records whose title, artist or tags contain every word of the query, case-insensitively.
+
+    field limits the match to one of SEARCH_FIELDS. Results are cached until
+    the next rescan, so paging through them doesn't filter the library again.
+    """
+    refresh()
+    terms = tuple(query.lower().split())
+    if not terms:
+        return _records
+
+    with _lock:
+        cached = _search_cache.get((terms, field))
+        if cached is not None:
+            return cached
+        matches = [record for record, key in zip(_records, _search_keys) if _matches(key, terms, field)]
+        if len(_search_cache) >= SEARCH_CACHE_SIZE:
+            _search_cache.clear()
+        _search_cache[(terms, field)] = matches
+        return matches
+
+def get_page(records, page, page_size):
+    """The records on a zero-based page, with the page clamped to the available range, and the page count."""
+    page_count = max((len(records) + page_size - 1) // page_size, 1)
+    page = min(max(page, 0), page_count - 1)
+    return records[page * page_size:(page + 1) * page_size], page, page_count
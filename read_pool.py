@@ -0,0 +1,48 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Reads in flight at once across every session of the process
+FIREBASE_READ_WORKERS = int(os.getenv("FIREBASE_READ_WORKERS", 16))
+
+# Shared by every session, so concurrent refreshes can't open unbounded connections
+_pool = ThreadPoolExecutor(max_workers=FIREBASE_READ_WORKERS, thread_name_prefix="firebase-read")
+
+def submit(func, *args):
+    """Run a blocking read on the shared pool and return its future."""
+    return _pool.submit(func, *args)
+
+def deadline_after(seconds):
+    """Deadline for gather, or None to wait without limit."""
+    return None if seconds is None else time.monotonic() + seconds
+
+def gather(futures, deadline=None):
+    """Collect ({key: result}, missing keys) from {key: future} for the reads that finish before the deadline.
+
+    Reads still running at the deadline, or that failed, are left out of the
+    results and reported as missing; the ones that haven't started are
+    cancelled so they don't occupy the pool.
+    """
+    timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+    done, pending = wait(futures.values(), timeout=timeout)
+    for future in pending:
+        future.cancel()
+
+    results = {}
+    missing = set()
+    for key, future in futures.items():
+        if future not in done:
+            missing.add(key)
+            continue
+        try:
+            results[key] = future.result()
+        except Exception as e:
+            print(f"Error reading {key}: {e}")
+            missing.add(key)
+    if pending:
+        print(f"{len(pending)} reads missed the deadline")
+    return results, missing
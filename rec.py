@@ -1,34 +1,113 @@
+import os
+import sqlite3
+import threading
+from collections import Counter
 import pandas as pd
 import numpy as np
-import json
-import re
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy import sparse
+from dotenv import load_dotenv
 import firebase_config as fb
+import read_pool
+import als_model
+import cooccurrence
+import audio_features
+from feature_store import process_artists, process_tags, get_catalog_version
+from inverted_index import build_inverted_index, get_cached_index, lookup
+from catalog_scores import SCORE_DTYPE, build_incidence_matrix, compute_global_scores
 
-# ------- Artist and Tag Affinity Calculation -------
+# Load environment variables from .env file
+load_dotenv()
+
+# Get database path from environment variable
+DB_PATH = os.getenv("DB_PATH", "hot100.db")
+# Number of users read from Firebase for collaborative filtering, sized so
+# FIREBASE_READ_WORKERS concurrent reads finish within REC_FETCH_DEADLINE
+COLLAB_USER_LIMIT = int(os.getenv("COLLAB_USER_LIMIT", 500))
+# Seconds a refresh waits for its Firebase reads; reads that miss it are scored as empty
+REC_FETCH_DEADLINE = float(os.getenv("REC_FETCH_DEADLINE", 3))
+# Number of most similar users whose plays are turned into recommendations
+COLLAB_NEIGHBORS = 10
+# Collaborative component: "neighbors" (similar users' plays), "als" (trained factors)
+# or "cooccurrence" (songs played by the same users as the user's recent plays)
+COLLAB_BACKEND = os.getenv("COLLAB_BACKEND", "neighbors")
+# Weight of audio similarity to the user's played songs (0 disables it; requires python audio_features.py)
+AUDIO_SIMILARITY_WEIGHT = float(os.getenv("AUDIO_SIMILARITY_WEIGHT", 0))
+# Weights of the blended recommendation score; 'recency' scales the recency boost.
+# Tune them with benchmarks/evaluate.py.
+DEFAULT_WEIGHTS = {
+    'count': 0.35,
+    'engagement': 0.1,
+    'artist_affinity': 0.15,
+    'tag_affinity': 0.15,
+    'collaborative': 0.15,
+    'audio_similarity': AUDIO_SIMILARITY_WEIGHT,
+    'popularity': 0.1,
+    'recency': 0.5,
+}
+
+# Process-wide global scores, recomputed when the catalog version changes
+_global_scores = None
+_global_version = None
+_global_lock = threading.Lock()
+
+# ------- Request Data Snapshot -------
+
+def make_snapshot(user_id, plays, affinity_profile=None, play_index=None):
+    """Bundle already loaded play data for one recommendation request.
+    
+    plays maps user ids to play dicts and doubles as the collaborative cohort.
+    play_index is index_plays(plays), for callers scoring many users from the
+    same plays. Snapshots made this way never read from or write to Firebase.
+    """
+    return {
+        'user_id': user_id,
+        'user_plays': plays.get(user_id, {}),
+        'plays': plays,
+        'affinity_profile': affinity_profile,
+        'play_index': play_index,
+        'live': False,
+        'complete': True
+    }
+
+def read_user_plays(user_id):
+    """Start reading the user's plays on the read pool; pass the future to load_snapshot."""
+    return read_pool.submit(fb.get_user_play_counts, user_id)
 
-def process_artists(artist_str):
-    """Split artist names that contain featuring, with, &, etc."""
-    if isinstance(artist_str, str):
-        # Replace "Featuring" and other variants
-        artist_str = re.sub(r'Featuring|Feat\.|Feat|ft\.', '&', artist_str)
-        # Split by & or "with" 
-        artists = re.split(r'\s*&\s*|\s+with\s+', artist_str)
-        # Strip whitespace
-        return [artist.strip() for artist in artists]
-    return []
-
-def process_tags(tags_str):
-    """Process tags from JSON string to list."""
-    if isinstance(tags_str, str):
-        try:
-            # Parse JSON string
-            tags = json.loads(tags_str)
-            # Extract and clean tags
-            return [tag.lower().strip() for tag in tags]
-        except json.JSONDecodeError:
-            return []
-    return []
+def load_snapshot(user_id, user_limit=None, deadline=None, plays_read=None):
+    """Read everything one recommendation refresh needs from Firebase exactly once.
+    
+    The user's plays, their affinity profile and every cohort user's plays
+    are read concurrently, so the refresh takes about as long as the slowest
+    read. Reads that miss the deadline (REC_FETCH_DEADLINE seconds from now
+    by default) or fail are treated as empty and the snapshot is marked incomplete.
+    plays_read is a read_user_plays future the caller already started, so
+    the user's plays aren't read again.
+    """
+    if deadline is None:
+        deadline = read_pool.deadline_after(REC_FETCH_DEADLINE)
+    own = {
+        'plays': plays_read or read_user_plays(user_id),
+        'profile': read_pool.submit(fb.get_affinity_profile, user_id),
+    }
+    
+    # Trained factors and co-occurrence replace the cohort, so only the user's own plays are needed
+    if COLLAB_BACKEND == "cooccurrence" or get_als_model() is not None:
+        plays, cohort_complete = {}, True
+    else:
+        # The user's own plays are already being read above
+        plays, cohort_complete = fb.read_all_users_play_data(
+            limit=user_limit or COLLAB_USER_LIMIT, deadline=deadline, exclude=(user_id,)
+        )
+    own, _ = read_pool.gather(own, deadline)
+    
+    plays[user_id] = own.get('plays', {})
+    snapshot = make_snapshot(user_id, plays, own.get('profile'))
+    # A profile that wasn't read in time must not be overwritten with one rebuilt from the plays
+    snapshot['live'] = 'profile' in own
+    snapshot['complete'] = 'plays' in own and 'profile' in own and cohort_complete
+    return snapshot
+
+# ------- Artist and Tag Affinity Calculation -------
 
 def calculate_artist_affinity(df, user_plays=None):
     """Calculate user affinity for artists based on play counts."""
@@ -120,88 +199,324 @@ def score_by_tag_affinity(row, tag_affinity):
         score += tag_affinity.get(tag, 0)
     return score
 
+def build_affinity_profile(df, user_plays):
+    """Build raw artist/tag play counts from a user's full play history."""
+    artist_counts = Counter()
+    tag_counts = Counter()
+    tags_by_id = dict(zip(df['id'], df['tags_list']))
+    
+    for song_id, play_data in user_plays.items():
+        play_count = play_data.get('count', 0)
+        if play_count > 0:
+            for artist in process_artists(play_data.get('artist', '')):
+                if artist:
+                    artist_counts[artist] += play_count
+            for tag in tags_by_id.get(song_id, []):
+                if tag:
+                    tag_counts[tag] += play_count
+    
+    return {
+        'artists': dict(artist_counts),
+        'tags': dict(tag_counts),
+        'artist_total': sum(artist_counts.values()),
+        'tag_total': sum(tag_counts.values())
+    }
+
+def load_affinity_profile(df, snapshot):
+    """Get the snapshot user's affinity profile, building it from their history the first time."""
+    profile = snapshot['affinity_profile']
+    if profile is None and snapshot['user_plays']:
+        profile = build_affinity_profile(df, snapshot['user_plays'])
+        # Persist it so later plays can update it incrementally
+        if snapshot['live']:
+            fb.set_affinity_profile(snapshot['user_id'], profile)
+        snapshot['affinity_profile'] = profile
+    return profile
+
+def profile_affinity(profile, field):
+    """Normalize one section ('artists' or 'tags') of an affinity profile into an affinity dict."""
+    counts = profile.get(field, {})
+    total_plays = profile.get(f"{field[:-1]}_total") or 1  # Avoid division by zero
+    return {token: count / total_plays for token, count in counts.items()}
+
+# ------- Sparse Affinity Scoring -------
+
+def affinity_from_counts(matrix, song_counts):
+    """Calculate normalized token affinity from per-song play counts."""
+    # Only songs that have been played contribute to the profile
+    song_counts = np.where(song_counts > 0, song_counts, 0)
+    token_counts = matrix.T @ song_counts
+    total_plays = token_counts.sum() or 1  # Avoid division by zero
+    return token_counts / total_plays
+
+def affinity_to_vector(affinity, vocab):
+    """Map an affinity dict onto the token columns of an incidence matrix."""
+    vector = np.zeros(len(vocab))
+    for token, value in affinity.items():
+        col = vocab.get(token)
+        if col is not None:
+            vector[col] = value
+    return vector
+
+def calculate_affinity_scores(df, user_plays=None, profile=None, incidence=None):
+    """Score every song's artist and tag affinity with sparse matrix-vector products.
+    
+    incidence holds prebuilt (matrix, vocab) pairs under 'artist' and 'tag'
+    (see compute_global_scores); they are built from the token lists when not given.
+    """
+    if incidence is None:
+        incidence = {
+            'artist': build_incidence_matrix(df['artists_list']),
+            'tag': build_incidence_matrix(df['tags_list']),
+        }
+    artist_matrix, artist_vocab = incidence['artist']
+    tag_matrix, tag_vocab = incidence['tag']
+    
+    if profile is not None:
+        # Use the incrementally maintained profile instead of walking the play history
+        artist_vector = affinity_to_vector(profile_affinity(profile, 'artists'), artist_vocab)
+        tag_vector = affinity_to_vector(profile_affinity(profile, 'tags'), tag_vocab)
+        return artist_matrix @ artist_vector, tag_matrix @ tag_vector
+    
+    if user_plays is None:
+        # Use the count column from the dataframe (local DB)
+        song_counts = df['count'].fillna(0).to_numpy(dtype=np.float64)
+        artist_vector = affinity_from_counts(artist_matrix, song_counts)
+    else:
+        # Artists come from the play documents, which may reference songs outside the catalog
+        artist_vector = affinity_to_vector(calculate_artist_affinity(df, user_plays), artist_vocab)
+        user_count_map = {song_id: play_data.get('count', 0) for song_id, play_data in user_plays.items()}
+        song_counts = df['id'].map(user_count_map).fillna(0).to_numpy(dtype=np.float64)
+    
+    tag_vector = affinity_from_counts(tag_matrix, song_counts)
+    
+    return artist_matrix @ artist_vector, tag_matrix @ tag_vector
+
 # ------- Collaborative Filtering Component -------
 
-def calculate_user_similarity(target_user_plays, all_user_plays):
-    """Calculate similarity between target user and other users."""
-    if not target_user_plays:
-        return {}  # No user data to compare
-        
-    user_similarities = {}
+def top_k_indices(values, k):
+    """Return indices of the k largest values, in descending order with ties kept in index order.
+    
+    NaN values rank last, as with sort_values.
+    """
+    values = np.asarray(values, dtype=float)
+    values = np.where(np.isnan(values), -np.inf, values)
+    if k <= 0 or len(values) == 0:
+        return np.array([], dtype=np.intp)
+    if k >= len(values):
+        return np.argsort(-values, kind='stable')
+    
+    # Partition to find the k-th largest value, then keep the lowest-index ties
+    kth_value = np.partition(values, len(values) - k)[len(values) - k]
+    above = np.flatnonzero(values > kth_value)
+    ties = np.flatnonzero(values == kth_value)[:k - len(above)]
+    candidates = np.concatenate([above, ties])
+    return candidates[np.argsort(-values[candidates], kind='stable')]
+
+def build_play_matrix(all_user_plays, song_index=None):
+    """Build a CSR user x song play-count matrix from per-user play dicts."""
+    song_index = {} if song_index is None else song_index
+    user_ids = []
+    indptr = [0]
+    indices = []
+    data = []
     
     for user_id, plays in all_user_plays.items():
-        if user_id == 'target_user':
-            continue  # Skip comparing with self
-            
-        # Count songs in common and calculate play count similarity
-        common_songs = set(target_user_plays.keys()) & set(plays.keys())
-        if not common_songs:
-            user_similarities[user_id] = 0
-            continue
-            
-        # Calculate similarity based on play counts for common songs
-        similarity = 0
-        for song_id in common_songs:
-            target_count = target_user_plays[song_id].get('count', 0)
-            other_count = plays[song_id].get('count', 0)
-            # Add simple count similarity
-            similarity += min(target_count, other_count) / max(target_count, other_count)
-            
-        # Normalize by number of common songs
-        user_similarities[user_id] = similarity / len(common_songs)
+        user_ids.append(user_id)
+        for song_id, play_data in plays.items():
+            play_count = play_data.get('count', 0)
+            if play_count > 0:
+                indices.append(song_index.setdefault(song_id, len(song_index)))
+                data.append(play_count)
+        indptr.append(len(indices))
     
-    return user_similarities
+    play_matrix = sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float64), indices, indptr),
+        shape=(len(user_ids), len(song_index))
+    )
+    return play_matrix, user_ids, song_index
 
-def get_collaborative_recommendations(user_id, df, top_n=10):
+def index_plays(plays):
+    """Build the cohort's play matrix once, to be shared by every snapshot of the same plays."""
+    play_matrix, user_ids, song_index = build_play_matrix(plays)
+    return {
+        'rows': play_matrix,
+        # Column slices of a CSC copy only touch the sliced songs' plays
+        'columns': play_matrix.tocsc(),
+        'users': {user_id: row for row, user_id in enumerate(user_ids)},
+        'song_ids': np.array(list(song_index), dtype=object),
+    }
+
+def calculate_user_similarity_sparse(target_counts, play_matrix):
+    """Mean min/max play-count ratio over the songs each user has in common with the target user."""
+    target_songs = np.flatnonzero(target_counts)
+    
+    # Keep only the columns of songs the target user has played
+    common = play_matrix[:, target_songs].tocsr()
+    target_values = target_counts[target_songs][common.indices]
+    common.data = np.minimum(common.data, target_values) / np.maximum(common.data, target_values)
+    
+    # Normalize by number of common songs
+    common_songs = common.getnnz(axis=1)
+    similarity = np.asarray(common.sum(axis=1)).ravel()
+    return np.divide(similarity, common_songs, out=np.zeros(len(similarity)), where=common_songs > 0)
+
+def get_collaborative_recommendations(user_id, df, top_n=10, user_limit=None, snapshot=None):
     """Get recommendations based on similar users' preferences."""
     if not user_id:
         return {}  # No user ID provided
+    if snapshot is None:
+        snapshot = load_snapshot(user_id, user_limit)
         
     # Get target user's play data
-    target_user_plays = fb.get_user_play_counts(user_id)
+    target_user_plays = snapshot['user_plays']
     if not target_user_plays:
         return {}  # No play data for this user
+    
+    play_index = snapshot.get('play_index')
+    if play_index is not None and user_id in play_index['users']:
+        # Shared matrix with the target user as one of its rows
+        play_matrix, song_ids = play_index['rows'], play_index['song_ids']
+        if play_matrix.shape[0] < 2:
+            return {}
+        target_row = play_index['users'][user_id]
+        target_counts = play_matrix[target_row].toarray().ravel()
+        user_similarities = calculate_user_similarity_sparse(target_counts, play_index['columns'])
+        # Rank the target user last so they are only picked when there are too few others, then drop them
+        user_similarities[target_row] = -np.inf
+    else:
+        # Get all other users' play data
+        all_user_plays = dict(snapshot['plays'])
+        if user_id in all_user_plays:
+            del all_user_plays[user_id]  # Remove target user
+        if not all_user_plays:
+            return {}
         
-    # Get all other users' play data
-    all_user_plays = fb.get_all_users_play_data(limit=50)
-    if user_id in all_user_plays:
-        del all_user_plays[user_id]  # Remove target user
-        
-    # Calculate user similarities
-    user_similarities = calculate_user_similarity(target_user_plays, all_user_plays)
+        # Build the user x song matrix, with the target user's songs as the first columns
+        target_matrix, _, song_index = build_play_matrix({user_id: target_user_plays})
+        play_matrix, _, song_index = build_play_matrix(all_user_plays, song_index)
+        target_counts = np.zeros(len(song_index))
+        target_counts[:target_matrix.shape[1]] = target_matrix.toarray().ravel()
+        song_ids = np.array(list(song_index), dtype=object)
+        target_row = -1
+        user_similarities = calculate_user_similarity_sparse(target_counts, play_matrix)
     
-    # Get recommendations from similar users
-    song_scores = {}
+    # Keep the most similar users
+    neighbors = top_k_indices(user_similarities, COLLAB_NEIGHBORS)
+    neighbors = neighbors[neighbors != target_row]
+    neighbor_plays = play_matrix[neighbors]
     
-    for other_user_id, similarity in sorted(user_similarities.items(), key=lambda x: x[1], reverse=True)[:10]:
-        # Only consider the top 10 most similar users
-        other_user_plays = all_user_plays[other_user_id]
-        
-        for song_id, play_data in other_user_plays.items():
-            if song_id in target_user_plays:
-                continue  # Skip songs the user has already played
-                
-            play_count = play_data.get('count', 0)
-            if song_id in song_scores:
-                song_scores[song_id] += similarity * play_count
-            else:
-                song_scores[song_id] = similarity * play_count
+    # Score candidate songs as similarity-weighted play counts
+    song_scores = neighbor_plays.T @ user_similarities[neighbors]
+    
+    # Skip songs the user has already played and songs no neighbor has played
+    candidates = (neighbor_plays.getnnz(axis=0) > 0) & (target_counts == 0)
+    song_scores = np.where(candidates, song_scores, -np.inf)
     
-    # Sort songs by score
-    return {k: v for k, v in sorted(song_scores.items(), key=lambda x: x[1], reverse=True)[:top_n]}
+    top_songs = top_k_indices(song_scores, min(top_n, int(candidates.sum())))
+    return dict(zip(song_ids[top_songs], song_scores[top_songs]))
+
+def get_als_model():
+    """The trained ALS model when it is the configured backend and has been trained, else None."""
+    if COLLAB_BACKEND != "als":
+        return None
+    return als_model.load_model()
+
+def get_als_scores(model, user_id, df, user_plays):
+    """Score every song with one dot product against the user's factors, skipping played songs."""
+    scores = als_model.score_songs(model, user_id, user_plays, df['id'])
+    played = pd.Index(df['id']).get_indexer(list(user_plays))
+    scores[played[played >= 0]] = 0
+    return np.maximum(scores, 0)
+
+def get_cooccurrence_scores(user_id, df, user_plays):
+    """Score songs by the co-occurrence rows of the user's recent plays, skipping played songs."""
+    with sqlite3.connect(DB_PATH) as conn:
+        recent = cooccurrence.get_recent_songs(conn, user_id)
+        song_scores = cooccurrence.score_candidates(conn, recent)
+    
+    scores = df['id'].map(song_scores).fillna(0).to_numpy(dtype=SCORE_DTYPE)
+    played = pd.Index(df['id']).get_indexer(list(user_plays))
+    scores[played[played >= 0]] = 0
+    return scores
+
+# ------- Global Catalog Scores -------
+
+def get_global_scores(df, catalog_version):
+    """Return the process-wide global scores for the catalog version, computing them when it changed."""
+    global _global_scores, _global_version
+    with _global_lock:
+        if _global_scores is None or _global_version != catalog_version:
+            _global_scores = compute_global_scores(df)
+            _global_version = catalog_version
+        return _global_scores
+
+def _aligned_global_scores(df, global_scores):
+    """Use global_scores only if they were computed over the same songs in the same order."""
+    if global_scores is not None and np.array_equal(global_scores['ids'], df['id'].to_numpy()):
+        return global_scores
+    return compute_global_scores(df)
+
+def is_cold_start(df, user_id, user_plays):
+    """Whether there is no play history to personalize with."""
+    return bool((user_id and not user_plays) or (not user_id and not (df['count'] > 0).any()))
 
 # ------- Main Recommendation System -------
 
-def cal_scores(df, user_id=None):
-    """Calculate recommendation scores for songs."""
-    # Process data for recommendation
-    df['artists_list'] = df['artist'].apply(process_artists)
-    df['tags_list'] = df['tags'].apply(process_tags)
+def blend_scores(components, weights=None):
+    """Blend score components into the recommendation score.
+    
+    components maps component names to equally shaped arrays (DataFrame
+    columns, or users x songs matrices); weights overrides DEFAULT_WEIGHTS.
+    """
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    return (
+        # Direct user interaction signals (45%)
+        components['count_normalized'] * weights['count'] +             # Play count is very important
+        components['engagement_ratio'] * weights['engagement'] +        # How engaging the content is
+        
+        # Personalization signals (30%)
+        components['artist_affinity_score'] * weights['artist_affinity'] +  # Artist preference
+        components['tag_affinity_score'] * weights['tag_affinity'] +        # Genre preference
+        
+        # Collaborative filtering (15%)
+        components['collaborative_score'] * weights['collaborative'] +
+        
+        # Audio content similarity (off unless configured)
+        components['audio_similarity_score'] * weights['audio_similarity'] +
+        
+        # Global popularity (10%)
+        components['popularity_score'] * weights['popularity']          # General popularity
+    ) * (1 + components['recency_factor'] * weights['recency'])         # Recency boost
+
+def cal_scores(df, user_id=None, vectorized=True, snapshot=None, global_scores=None, weights=None):
+    """Calculate recommendation scores for songs.
+    
+    With vectorized=True the artist/tag affinities are computed as sparse
+    matrix-vector products; vectorized=False keeps the original row-wise path.
+    snapshot holds the user's play data for this request; it is loaded from
+    Firebase when not given. global_scores (see get_global_scores) supplies
+    the user-independent components; they are computed here when not given.
+    weights overrides DEFAULT_WEIGHTS; components weighted 0 are not computed.
+    """
+    global_scores = _aligned_global_scores(df, global_scores)
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    
+    # Process data for recommendation, reusing features attached from the feature store
+    if 'artists_list' not in df.columns:
+        df['artists_list'] = df['artist'].apply(process_artists)
+    if 'tags_list' not in df.columns:
+        df['tags_list'] = df['tags'].apply(process_tags)
     
     # Get user-specific play counts if a user ID is provided
     user_plays = None
+    affinity_profile = None
     if user_id:
-        user_plays = fb.get_user_play_counts(user_id)
+        if snapshot is None:
+            snapshot = load_snapshot(user_id)
+        user_plays = snapshot['user_plays']
+        if vectorized:
+            affinity_profile = load_affinity_profile(df, snapshot)
     
     # Calculate normalized counts and engagement metrics
     max_count = df['count'].max()
@@ -213,145 +528,172 @@ def cal_scores(df, user_id=None):
         user_count_map = {song_id: play_data.get('count', 0) for song_id, play_data in user_plays.items()}
         
         # Apply user-specific counts to the dataframe
-        df['user_count'] = df['id'].apply(lambda x: user_count_map.get(x, 0))
+        df['user_count'] = df['id'].map(user_count_map).fillna(0).astype(SCORE_DTYPE)
         max_user_count = max(user_count_map.values()) if user_count_map else 0
         
         # Normalize user counts
         if max_user_count > 0:
-            df['count_normalized'] = df['user_count'] / max_user_count
+            df['count_normalized'] = df['user_count'] / SCORE_DTYPE(max_user_count)
         else:
-            df['count_normalized'] = 0
+            df['count_normalized'] = np.zeros(len(df), dtype=SCORE_DTYPE)
     else:
         # Use local DB counts
         if max_count > min_count:
-            df['count_normalized'] = (df['count'] - min_count) / (max_count - min_count)
+            df['count_normalized'] = ((df['count'] - min_count) / (max_count - min_count)).astype(SCORE_DTYPE)
         else:
-            df['count_normalized'] = df['count'].apply(lambda x: 1.0 if x > 0 else 0.0)
+            df['count_normalized'] = (df['count'] > 0).astype(SCORE_DTYPE)
     
-    # Calculate engagement metrics if available
-    if 'views' in df.columns and 'like_count' in df.columns:
-        df['engagement_ratio'] = df.apply(
-            lambda row: row['like_count'] / max(row['views'], 1) if pd.notnull(row['views']) and pd.notnull(row['like_count']) else 0, 
-            axis=1
-        )
-    else:
-        df['engagement_ratio'] = 0
+    # Engagement metrics are shared by every user
+    df['engagement_ratio'] = global_scores['engagement_ratio']
     
     # Calculate recency factor
-    df['recency_factor'] = df['count_normalized'] * 1.5  # Boost recent plays
-    
-    # Calculate artist and tag affinity
-    artist_affinity = calculate_artist_affinity(df, user_plays)
-    tag_affinity = calculate_tag_affinity(df, user_plays)
+    df['recency_factor'] = df['count_normalized'] * SCORE_DTYPE(1.5)  # Boost recent plays
     
-    # Apply the affinity scores
-    df['artist_affinity_score'] = df.apply(lambda row: score_by_artist_affinity(row, artist_affinity), axis=1)
-    df['tag_affinity_score'] = df.apply(lambda row: score_by_tag_affinity(row, tag_affinity), axis=1)
+    # Calculate and apply artist and tag affinity
+    if vectorized:
+        artist_scores, tag_scores = calculate_affinity_scores(
+            df, user_plays, affinity_profile, global_scores['incidence']
+        )
+        df['artist_affinity_score'] = artist_scores.astype(SCORE_DTYPE)
+        df['tag_affinity_score'] = tag_scores.astype(SCORE_DTYPE)
+    else:
+        artist_affinity = calculate_artist_affinity(df, user_plays)
+        tag_affinity = calculate_tag_affinity(df, user_plays)
+        
+        df['artist_affinity_score'] = df.apply(lambda row: score_by_artist_affinity(row, artist_affinity), axis=1)
+        df['tag_affinity_score'] = df.apply(lambda row: score_by_tag_affinity(row, tag_affinity), axis=1)
     
     # Calculate collaborative filtering score if user is logged in
-    if user_id:
-        # Get collaborative recommendations
-        collab_recs = get_collaborative_recommendations(user_id, df)
-        
-        # Add collaborative scores to dataframe
-        df['collaborative_score'] = df['id'].apply(lambda x: collab_recs.get(x, 0))
+    if user_id and weights['collaborative']:
+        model = get_als_model()
+        if COLLAB_BACKEND == "cooccurrence" and user_plays:
+            # Neighbor rows of the user's recent plays, independent of the number of users
+            df['collaborative_score'] = get_cooccurrence_scores(user_id, df, user_plays)
+        elif model is not None and user_plays:
+            # Trained factors: one dot product per song
+            df['collaborative_score'] = get_als_scores(model, user_id, df, user_plays)
+        else:
+            # Get collaborative recommendations
+            collab_recs = get_collaborative_recommendations(user_id, df, snapshot=snapshot)
+            
+            # Add collaborative scores to dataframe
+            df['collaborative_score'] = df['id'].map(collab_recs).fillna(0).astype(SCORE_DTYPE)
     else:
-        df['collaborative_score'] = 0
+        df['collaborative_score'] = np.zeros(len(df), dtype=SCORE_DTYPE)
     
-    # Calculate popularity score (normalize views and likes if available)
-    if 'views' in df.columns and 'like_count' in df.columns:
-        max_views = df['views'].max() or 1
-        max_likes = df['like_count'].max() or 1
-        
-        df['views_normalized'] = df['views'] / max_views
-        df['likes_normalized'] = df['like_count'] / max_likes
-        
-        df['popularity_score'] = (df['views_normalized'] * 0.7) + (df['likes_normalized'] * 0.3)
+    # Audio similarity to the songs the user played, when extracted features are available
+    features = audio_features.load_feature_matrix() if weights['audio_similarity'] > 0 and user_plays else None
+    if features is not None:
+        df['audio_similarity_score'] = audio_features.audio_similarity(features, df['id'], user_count_map)
     else:
-        df['popularity_score'] = 0
+        df['audio_similarity_score'] = np.zeros(len(df), dtype=SCORE_DTYPE)
+    
+    # Popularity score (normalized views and likes) is shared by every user
+    if global_scores['views_normalized'] is not None:
+        df['views_normalized'] = global_scores['views_normalized']
+        df['likes_normalized'] = global_scores['likes_normalized']
+    df['popularity_score'] = global_scores['popularity_score']
     
     # Final blended recommendation score
-    df['recommendation_score'] = (
-        # Direct user interaction signals (45%)
-        df['count_normalized'] * 0.35 +             # Play count is very important
-        df['engagement_ratio'] * 0.1 +              # How engaging the content is
-        
-        # Personalization signals (30%)
-        df['artist_affinity_score'] * 0.15 +        # Artist preference
-        df['tag_affinity_score'] * 0.15 +           # Genre preference
-        
-        # Collaborative filtering (15%)
-        df['collaborative_score'] * 0.15 +
-        
-        # Global popularity (10%)
-        df['popularity_score'] * 0.1                # General popularity
-    ) * (1 + df['recency_factor'] * 0.5)            # Recency boost
+    df['recommendation_score'] = blend_scores(df, weights)
     
     # Handle cold start for new users (no play history)
-    if (user_id and not user_plays) or (not user_id and df[df['count'] > 0].empty):
+    if is_cold_start(df, user_id, user_plays):
         # If no songs have been played, use popularity & engagement
-        df['recommendation_score'] = (
-            df['popularity_score'] * 0.7 +
-            df['engagement_ratio'] * 0.3
-        )
+        df['recommendation_score'] = global_scores['cold_start_score']
     
     return df
 
-def get_recommendations(df, n=5, exclude_played=False, user_id=None):
-    """Get top N song recommendations."""
+def rank_recommendations(df, exclude_played=False, user_id=None, snapshot=None, global_scores=None, weights=None):
+    """Score the catalog once and return a ranking that can be paged without re-scoring."""
+    # Read the user's Firebase data once for the whole request
+    if user_id and snapshot is None:
+        snapshot = load_snapshot(user_id)
+    
     # Calculate scores with user data if available
-    df = cal_scores(df, user_id)
+    global_scores = _aligned_global_scores(df, global_scores)
+    df = cal_scores(df, user_id, snapshot=snapshot, global_scores=global_scores, weights=weights)
     
-    # Filter out played songs if requested
+    # Mask out played songs if requested
+    played = np.zeros(len(df), dtype=bool)
     if exclude_played:
         if user_id:
-            # Get user's play history
-            user_plays = fb.get_user_play_counts(user_id)
-            played_songs = list(user_plays.keys())
-            
-            # Filter dataframe
-            df_filtered = df[~df['id'].isin(played_songs)]
+            # Hash lookup of the user's played ids in the catalog
+            positions = pd.Index(df['id']).get_indexer(list(snapshot['user_plays']))
+            played[positions[positions >= 0]] = True
         else:
             # Use local count column
-            df_filtered = df[df['count'] == 0]
-    else:
-        df_filtered = df
-    
-    # Sort by recommendation score
-    df_sorted = df_filtered.sort_values('recommendation_score', ascending=False)
+            played = df['count'].to_numpy() != 0
     
-    # Get top N recommendations
-    recommendations = df_sorted.head(n)
+    # Ranked prefix found so far, extended as deeper pages are requested
+    order = np.array([], dtype=np.intp)
+    if is_cold_start(df, user_id, snapshot['user_plays'] if user_id else None):
+        # Reuse the precomputed cold-start ranking, renumbered to candidate positions
+        cold_start_order = global_scores['cold_start_order']
+        order = (np.cumsum(~played) - 1)[cold_start_order[~played[cold_start_order]]]
     
-    # Format output as a user-friendly list
-    result = []
-    for i, (_, song) in enumerate(recommendations.iterrows()):
-        result.append({
-            'rank': i+1,
-            'song': song['song'],
-            'artist': song['artist'],
-            'recommendation_score': song['recommendation_score'],
-            'id': song['id']
-        })
+    # Keep only the columns the records need, never a copy of the frame
+    candidates = np.flatnonzero(~played)
+    return {
+        'scores': df['recommendation_score'].to_numpy()[candidates],
+        'ids': df['id'].to_numpy()[candidates],
+        'songs': df['song'].to_numpy()[candidates],
+        'artists': df['artist'].to_numpy()[candidates],
+        'order': order,
+        # False when some of the user's data missed the fetch deadline
+        'complete': snapshot['complete'] if user_id else True,
+    }
+
+def get_recommendation_page(ranking, offset=0, limit=5):
+    """Get recommendations ranked offset+1 to offset+limit from a ranking."""
+    end = offset + limit
+    if end > len(ranking['order']):
+        ranking['order'] = top_k_indices(ranking['scores'], end)
     
-    return result 
+    return [
+        {
+            'rank': offset + i + 1,
+            'song': ranking['songs'][pos],
+            'artist': ranking['artists'][pos],
+            'recommendation_score': float(ranking['scores'][pos]),
+            'id': ranking['ids'][pos]
+        }
+        for i, pos in enumerate(ranking['order'][offset:end])
+    ]
 
-def get_recommendations_by_artist(df, artist, n=3):
+def get_recommendations(df, n=5, exclude_played=False, user_id=None, snapshot=None, offset=0, global_scores=None,
+                        weights=None):
+    """Get top N song recommendations, starting after the first `offset`."""
+    ranking = rank_recommendations(df, exclude_played, user_id, snapshot, global_scores, weights)
+    return get_recommendation_page(ranking, offset, n)
+
+def build_search_index(df, global_scores=None):
+    """Score the catalog without a user and build artist/tag inverted indexes over it."""
+    return build_inverted_index(cal_scores(df, global_scores=global_scores))
+
+def get_search_index(df, catalog_version=None, global_scores=None):
+    """Return the process-wide search index, built from df once per catalog version.
+
+    df must be the catalog at catalog_version; when catalog_version is None
+    the database's current version is used.
+    """
+    if catalog_version is None:
+        with sqlite3.connect(DB_PATH) as conn:
+            catalog_version = get_catalog_version(conn)
+    return get_cached_index(catalog_version, lambda: build_search_index(df, global_scores))
+
+def get_recommendations_by_artist(df, artist, n=3, index=None, catalog_version=None):
     """Get top N song recommendations by a specific artist"""
-    model_df = cal_scores(df)
-    
-    # Filter by artist (case insensitive partial match)
-    artist_df = model_df[model_df['artist'].str.lower().str.contains(artist.lower())]
+    if index is None:
+        index = get_search_index(df, catalog_version)
     
-    # Sort by recommendation score and return top N
-    return artist_df.head(n)[['artist', 'song', 'recommendation_score']]
+    # Normalized-token and prefix match on the artist index, already sorted by score
+    return lookup(index, 'artist', artist, n)[['artist', 'song', 'recommendation_score']]
 
-def get_recommendations_by_tag(df, tag, n=3):
+def get_recommendations_by_tag(df, tag, n=3, index=None, catalog_version=None):
     """Get top N song recommendations with a specific tag/genre"""
-    model_df = cal_scores(df)
-    
-    # Filter songs that have this tag
-    tag_matches = model_df[model_df['tags_list'].apply(lambda tags: any(tag.lower() in t.lower() for t in tags))]
+    if index is None:
+        index = get_search_index(df, catalog_version)
     
-    # Sort by recommendation score and return top N
-    return tag_matches.head(n)[['artist', 'song', 'recommendation_score']] 
\ No newline at end of file
+    # Normalized-token and prefix match on the tag index, already sorted by score
+    return lookup(index, 'tag', tag, n)[['artist', 'song', 'recommendation_score']]
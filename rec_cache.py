@@ -0,0 +1,66 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Maximum number of cached recommendation lists kept per process
+REC_CACHE_MAX_ENTRIES = int(os.getenv("REC_CACHE_MAX_ENTRIES", 1024))
+# Seconds a cached list stays valid, bounding staleness from plays on other devices
+REC_CACHE_TTL = int(os.getenv("REC_CACHE_TTL", 900))
+# Seconds a list scored without reads that missed the fetch deadline stays valid
+REC_CACHE_PARTIAL_TTL = int(os.getenv("REC_CACHE_PARTIAL_TTL", 60))
+
+# Module state is shared by every Streamlit session running in this process
+_cache = OrderedDict()  # (user_id, catalog_version, play_version) -> (expires_at, recommendations)
+_play_versions = {}  # user_id -> number of plays recorded by this process
+_lock = threading.Lock()
+
+def get_play_version(user_id):
+    """Get the user's play version, bumped every time a play is recorded."""
+    with _lock:
+        return _play_versions.get(user_id, 0)
+
+def bump_play_version(user_id):
+    """Record a play for the user, invalidating their cached recommendations."""
+    with _lock:
+        _play_versions[user_id] = _play_versions.get(user_id, 0) + 1
+        # Entries for older versions can never be hit again, so drop them now
+        for key in [key for key in _cache if key[0] == user_id]:
+            del _cache[key]
+
+def get_recommendations(user_id, catalog_version):
+    """Return the cached recommendations for the user, or None if missing or stale."""
+    with _lock:
+        key = (user_id, catalog_version, _play_versions.get(user_id, 0))
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+
+        expires_at, recommendations = entry
+        if time.time() > expires_at:
+            del _cache[key]
+            return None
+
+        # Mark as most recently used
+        _cache.move_to_end(key)
+        return recommendations
+
+def put_recommendations(user_id, catalog_version, recommendations, ttl=REC_CACHE_TTL):
+    """Cache recommendations for the user at the current catalog and play versions for ttl seconds."""
+    with _lock:
+        key = (user_id, catalog_version, _play_versions.get(user_id, 0))
+        _cache[key] = (time.time() + ttl, recommendations)
+        _cache.move_to_end(key)
+
+        # Evict least recently used entries
+        while len(_cache) > REC_CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+def clear():
+    """Drop every cached recommendation list."""
+    with _lock:
+        _cache.clear()
@@ -3,6 +3,7 @@ import json
 import subprocess
 import streamlit as st
 from dotenv import load_dotenv
+from audio_server import AUDIO_SERVER_HOST, AUDIO_SERVER_PORT, AUDIO_SERVER_URL, start_server
 
 # Load environment variables from .env file
 load_dotenv()
@@ -110,9 +111,24 @@ def main():
     except Exception as e:
         print(f"Error checking Firebase config: {e}")
     
+    # Stream audio with byte ranges from a server alongside the app
+    env = dict(os.environ)
+    audio_server = None
+    try:
+        audio_server = start_server()
+        if not AUDIO_SERVER_URL:
+            env["AUDIO_SERVER_URL"] = f"http://localhost:{AUDIO_SERVER_PORT}"
+        print(f"Audio server listening on {AUDIO_SERVER_HOST}:{AUDIO_SERVER_PORT}")
+    except OSError as e:
+        print(f"Could not start the audio server, audio will be sent through Streamlit: {e}")
+    
     # Launch the Streamlit app
     print("Launching Groovy app...")
-    subprocess.run(["streamlit", "run", "Groovy.py"])
+    try:
+        subprocess.run(["streamlit", "run", "Groovy.py"], env=env)
+    finally:
+        if audio_server:
+            audio_server.shutdown()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
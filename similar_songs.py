@@ -0,0 +1,288 @@
+import os
+import sqlite3
+from collections import Counter, defaultdict
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfTransformer
+from sklearn.preprocessing import normalize
+from dotenv import load_dotenv
+from feature_store import init_catalog_meta, init_feature_store, sync_features, load_features
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Get database path from environment variable
+DB_PATH = os.getenv("DB_PATH", "hot100.db")
+# Number of neighbors precomputed per song
+NEIGHBOR_K = 10
+# Songs scored against the catalog per sparse product when building the index
+CHUNK_SIZE = 1024
+
+def init_neighbor_index(conn):
+    """Create the song neighbor tables if they don't exist."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS song_neighbors (
+            id TEXT,
+            rank INTEGER,
+            neighbor_id TEXT,
+            score REAL,
+            PRIMARY KEY (id, rank)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_song_neighbors_neighbor ON song_neighbors (neighbor_id)")
+
+    # IDF of every token and TF-IDF norm of every song, kept from the last full build for incremental updates
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS neighbor_idf (
+            kind TEXT,
+            token_id INTEGER,
+            idf REAL,
+            PRIMARY KEY (kind, token_id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS neighbor_norms (
+            id TEXT PRIMARY KEY,
+            norm REAL
+        )
+    """)
+    conn.commit()
+
+# ------- TF-IDF Vectors -------
+
+def build_tfidf_matrix(features):
+    """Build L2-normalized TF-IDF vectors over each song's artist and tag tokens.
+
+    Returns the matrix, the IDF of every artist then tag token, the number of
+    artist columns, and each song's vector norm before normalization.
+    """
+    # Tag ids are offset past the artist ids so both share one column space
+    n_artists = max((max(ids) for ids in features['artist_ids'] if ids), default=-1) + 1
+    n_tags = max((max(ids) for ids in features['tag_ids'] if ids), default=-1) + 1
+
+    rows = []
+    cols = []
+    for row, (artist_ids, tag_ids) in enumerate(zip(features['artist_ids'], features['tag_ids'])):
+        cols.extend(artist_ids)
+        cols.extend(n_artists + tag_id for tag_id in tag_ids)
+        rows.extend([row] * (len(artist_ids) + len(tag_ids)))
+
+    counts = sparse.csr_matrix(
+        (np.ones(len(cols)), (rows, cols)),
+        shape=(len(features), n_artists + n_tags)
+    )
+    transformer = TfidfTransformer(norm=None).fit(counts)
+    weighted = transformer.transform(counts).tocsr()
+    norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+    return normalize(weighted).tocsr(), transformer.idf_, n_artists, norms
+
+def _row_neighbors(similarities, self_position, k):
+    """Pick the k most similar songs from one sparse row of similarities."""
+    indices = similarities.indices
+    scores = similarities.data
+    keep = (indices != self_position) & (scores > 0)
+    indices, scores = indices[keep], scores[keep]
+
+    if len(scores) > k:
+        top = np.argpartition(-scores, k)[:k]
+        indices, scores = indices[top], scores[top]
+    order = np.argsort(-scores, kind='stable')
+    return list(zip(indices[order], scores[order]))
+
+def _compute_neighbors(tfidf, positions, k):
+    """Compute neighbor lists for the given song positions in chunked sparse products."""
+    neighbors = {}
+    for start in range(0, len(positions), CHUNK_SIZE):
+        chunk = positions[start:start + CHUNK_SIZE]
+        block = (tfidf[chunk] @ tfidf.T).tocsr()
+        for offset, position in enumerate(chunk):
+            neighbors[position] = _row_neighbors(block[offset], position, k)
+    return neighbors
+
+def _write_neighbors(conn, neighbors):
+    """Replace the stored neighbor lists of the songs in {song_id: [(neighbor_id, score), ...]}."""
+    conn.executemany("DELETE FROM song_neighbors WHERE id = ?", [(song_id,) for song_id in neighbors])
+    conn.executemany(
+        "INSERT INTO song_neighbors (id, rank, neighbor_id, score) VALUES (?, ?, ?, ?)",
+        [
+            (song_id, rank, neighbor_id, float(score))
+            for song_id, row in neighbors.items()
+            for rank, (neighbor_id, score) in enumerate(row)
+        ]
+    )
+
+# ------- Single-Song Vectors -------
+
+def _built_song_count(conn):
+    """Number of songs in the last full build, or None if the stored weights predate this index format."""
+    init_catalog_meta(conn)
+    row = conn.execute("SELECT value FROM catalog_meta WHERE key = 'neighbor_index_songs'").fetchone()
+    return row[0] if row else None
+
+def _unseen_idf(n_songs):
+    """IDF for tokens first seen after the last full build: that of a token used by a single song."""
+    return float(np.log((1 + n_songs) / 2) + 1)
+
+def _token_idf(conn, song_id, unseen_idf):
+    """A song's token counts and their stored IDF as {(kind, token_id): (count, idf)}."""
+    counts = Counter(conn.execute("SELECT kind, token_id FROM song_feature_tokens WHERE id = ?", (song_id,)))
+    tokens = {}
+    for (kind, token_id), count in counts.items():
+        row = conn.execute("SELECT idf FROM neighbor_idf WHERE kind = ? AND token_id = ?", (kind, token_id)).fetchone()
+        tokens[(kind, token_id)] = (count, row[0] if row else unseen_idf)
+    return tokens
+
+def _song_norms(conn, song_ids, unseen_idf):
+    """TF-IDF norms of songs, computing and storing those of songs added since the last full build."""
+    song_ids = list(song_ids)
+    norms = {}
+    for start in range(0, len(song_ids), CHUNK_SIZE):
+        chunk = song_ids[start:start + CHUNK_SIZE]
+        norms.update(conn.execute(
+            f"SELECT id, norm FROM neighbor_norms WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+        ))
+    for song_id in set(song_ids) - set(norms):
+        tokens = _token_idf(conn, song_id, unseen_idf)
+        norms[song_id] = float(np.sqrt(sum((count * idf) ** 2 for count, idf in tokens.values())))
+        conn.execute("INSERT OR REPLACE INTO neighbor_norms (id, norm) VALUES (?, ?)", (song_id, norms[song_id]))
+    return norms
+
+def _song_similarities(conn, song_id, unseen_idf):
+    """Cosine similarity of one song to every other song sharing a token with it.
+
+    Only the songs listed under the song's own tokens are read, so the cost
+    follows how many songs share its artists and tags, not the catalog size.
+    """
+    tokens = _token_idf(conn, song_id, unseen_idf)
+    norm = float(np.sqrt(sum((count * idf) ** 2 for count, idf in tokens.values())))
+    conn.execute("INSERT OR REPLACE INTO neighbor_norms (id, norm) VALUES (?, ?)", (song_id, norm))
+    if not norm:
+        return {}
+
+    dots = defaultdict(float)
+    for (kind, token_id), (count, idf) in tokens.items():
+        for other_id, other_count in conn.execute(
+            "SELECT id, COUNT(*) FROM song_feature_tokens WHERE kind = ? AND token_id = ? GROUP BY id",
+            (kind, token_id)
+        ):
+            dots[other_id] += count * other_count * idf * idf
+    dots.pop(song_id, None)
+
+    norms = _song_norms(conn, dots, unseen_idf)
+    return {other_id: dot / (norm * norms[other_id]) for other_id, dot in dots.items() if norms[other_id]}
+
+def _top_neighbors(similarities, k):
+    """The k most similar songs from {song_id: score}, most similar first."""
+    ranked = sorted(((score, other_id) for other_id, score in similarities.items() if score > 0), reverse=True)
+    return [(other_id, score) for score, other_id in ranked[:k]]
+
+# ------- Index Maintenance -------
+
+def build_neighbor_index(conn, k=NEIGHBOR_K):
+    """Precompute the top-k content neighbors of every song in the catalog.
+
+    Also stores the IDF weights and song norms that update_song_neighbors
+    scores single songs with until the next full build.
+    """
+    init_neighbor_index(conn)
+    sync_features(conn)
+    features = load_features(conn)
+    song_ids = features['id'].to_numpy()
+
+    tfidf, idf, n_artists, norms = build_tfidf_matrix(features)
+    neighbors = _compute_neighbors(tfidf, np.arange(len(song_ids)), k)
+
+    conn.execute("DELETE FROM song_neighbors")
+    _write_neighbors(conn, {
+        song_ids[position]: [(song_ids[neighbor], score) for neighbor, score in row]
+        for position, row in neighbors.items()
+    })
+
+    conn.execute("DELETE FROM neighbor_idf")
+    conn.executemany(
+        "INSERT INTO neighbor_idf (kind, token_id, idf) VALUES (?, ?, ?)",
+        [("artist", col, float(value)) for col, value in enumerate(idf[:n_artists])]
+        + [("tag", col, float(value)) for col, value in enumerate(idf[n_artists:])]
+    )
+    conn.execute("DELETE FROM neighbor_norms")
+    conn.executemany("INSERT INTO neighbor_norms (id, norm) VALUES (?, ?)", zip(song_ids, norms.tolist()))
+    init_catalog_meta(conn)
+    conn.execute(
+        "INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('neighbor_index_songs', ?)",
+        (len(song_ids),)
+    )
+    conn.commit()
+    return len(neighbors)
+
+def update_song_neighbors(conn, song_id, k=NEIGHBOR_K):
+    """Incrementally refresh the index after one song's artists or tags changed.
+
+    The song is scored with the IDF weights stored by the last full build, and
+    only against songs that share a token with it. Songs that listed it are
+    rescored the same way; songs it now outranks a stored neighbor for gain it
+    in place. Nothing scans the whole catalog; IDF drift is corrected by the
+    next build_neighbor_index. The caller syncs the feature store first.
+    """
+    init_neighbor_index(conn)
+    n_songs = _built_song_count(conn)
+    if n_songs is None or conn.execute("SELECT 1 FROM song_neighbors LIMIT 1").fetchone() is None:
+        return build_neighbor_index(conn, k)
+    init_feature_store(conn)
+    unseen_idf = _unseen_idf(n_songs)
+
+    # Songs whose neighbor list currently references the changed song
+    referencing = {
+        row[0] for row in conn.execute("SELECT id FROM song_neighbors WHERE neighbor_id = ?", (song_id,))
+    }
+    updated = {}
+    if conn.execute("SELECT 1 FROM song_features WHERE id = ?", (song_id,)).fetchone() is None:
+        # The song was removed from the catalog
+        conn.execute("DELETE FROM song_neighbors WHERE id = ?", (song_id,))
+        conn.execute("DELETE FROM neighbor_norms WHERE id = ?", (song_id,))
+        similarities = {}
+    else:
+        similarities = _song_similarities(conn, song_id, unseen_idf)
+        updated[song_id] = _top_neighbors(similarities, k)
+
+    for other_id in referencing - {song_id}:
+        updated[other_id] = _top_neighbors(_song_similarities(conn, other_id, unseen_idf), k)
+
+    # Songs that could now rank the changed song, given their weakest stored neighbor
+    candidates = [other_id for other_id in similarities if other_id not in updated]
+    for start in range(0, len(candidates), CHUNK_SIZE):
+        chunk = candidates[start:start + CHUNK_SIZE]
+        weakest = {
+            other_id: (min_score if count >= k else 0)
+            for other_id, count, min_score in conn.execute(
+                f"SELECT id, COUNT(*), MIN(score) FROM song_neighbors WHERE id IN ({', '.join('?' * len(chunk))}) GROUP BY id",
+                chunk
+            )
+        }
+        for other_id in chunk:
+            score = similarities[other_id]
+            if score > weakest.get(other_id, 0):
+                stored = conn.execute(
+                    "SELECT neighbor_id, score FROM song_neighbors WHERE id = ? ORDER BY rank", (other_id,)
+                ).fetchall()
+                updated[other_id] = _top_neighbors({**dict(stored), song_id: score}, k)
+
+    _write_neighbors(conn, updated)
+    conn.commit()
+    return len(updated)
+
+# ------- Lookup -------
+
+def get_similar_songs(conn, song_id, k=5):
+    """Return up to k precomputed (neighbor_id, score) pairs for a song, most similar first.
+
+    A plain read: the app creates the tables once per process (init_neighbor_index).
+    """
+    return conn.execute(
+        "SELECT neighbor_id, score FROM song_neighbors WHERE id = ? ORDER BY rank LIMIT ?",
+        (song_id, k)
+    ).fetchall()
+
+if __name__ == "__main__":
+    with sqlite3.connect(DB_PATH) as conn:
+        indexed = build_neighbor_index(conn)
+    print(f"Built neighbor index for {indexed} songs")
@@ -0,0 +1,161 @@
+import os
+import time
+import sqlite3
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from PIL import Image, ImageOps
+from dotenv import load_dotenv
+from hashing import file_hash
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Get configuration values from environment variables
+DB_PATH = os.getenv("DB_PATH", "hot100.db")
+IMG_DIR = "assets/imgs"
+THUMB_DIR = "assets/thumbs"
+# Side, in CSS pixels, of the album art shown in the UI
+THUMBNAIL_SIZE = 170
+# Density generated and served: 1 for standard displays, 2 for high-DPI ones
+THUMBNAIL_SCALE = int(os.getenv("THUMBNAIL_SCALE", 2))
+# WebP quality of the thumbnails
+THUMBNAIL_QUALITY = 80
+
+def init_thumbnails_table(conn):
+    """Create the per-image thumbnail cache table if it doesn't exist."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS thumbnails (
+            id TEXT PRIMARY KEY,
+            source_hash TEXT,
+            source_size INTEGER,
+            source_mtime REAL,
+            generated_at INTEGER
+        )
+    """)
+    conn.commit()
+
+def thumbnail_name(song_id, scale=THUMBNAIL_SCALE):
+    """File name of a song's thumbnail at a pixel density."""
+    return f"{song_id}@{scale}x.webp"
+
+# ------- Resizing -------
+
+def make_thumbnails(song_id, path, digest, thumb_dir=THUMB_DIR):
+    """Worker task: crop an image to a centered square and save it as WebP at THUMBNAIL_SCALE.
+
+    Images are never enlarged, so a small source gives a smaller thumbnail.
+    """
+    side = THUMBNAIL_SIZE * THUMBNAIL_SCALE
+    with Image.open(path) as source:
+        # Let the JPEG decoder downscale while decoding when the source is much larger
+        source.draft("RGB", (side, side))
+        image = ImageOps.exif_transpose(source).convert("RGB")
+
+    side = min(side, *image.size)
+    thumb = ImageOps.fit(image, (side, side), Image.Resampling.LANCZOS)
+    # Write through a rename so the app never serves a partial file
+    target = os.path.join(thumb_dir, thumbnail_name(song_id))
+    tmp_path = f"{target}.tmp"
+    thumb.save(tmp_path, "WEBP", quality=THUMBNAIL_QUALITY, method=6)
+    os.replace(tmp_path, target)
+    return song_id, digest
+
+def remove_thumbnails(song_id, thumb_dir=THUMB_DIR):
+    """Delete a song's thumbnail."""
+    path = os.path.join(thumb_dir, thumbnail_name(song_id))
+    if os.path.exists(path):
+        os.remove(path)
+
+# ------- Generation Job -------
+
+def generate_thumbnails(conn, img_dir=IMG_DIR, thumb_dir=THUMB_DIR, workers=None):
+    """Generate thumbnails for new or changed album art in parallel and cache them by source hash.
+
+    Images whose size and modification time are unchanged are skipped without
+    being read; images whose contents hash the same are skipped without
+    resizing, unless their thumbnail is missing. Thumbnails at other scales,
+    which the app never serves, are deleted.
+    """
+    init_thumbnails_table(conn)
+    os.makedirs(thumb_dir, exist_ok=True)
+    cached = {
+        row[0]: row[1:]
+        for row in conn.execute("SELECT id, source_hash, source_size, source_mtime FROM thumbnails")
+    }
+    existing = set(os.listdir(thumb_dir))
+    # Left over from another THUMBNAIL_SCALE, or from when every scale was generated
+    for file in existing:
+        if file.endswith(".webp") and not file.endswith(thumbnail_name("")):
+            os.remove(os.path.join(thumb_dir, file))
+
+    tasks = []
+    present = set()
+    for file in os.listdir(img_dir) if os.path.exists(img_dir) else []:
+        if not file.endswith(".jpg"):
+            continue
+        song_id = file[:-len(".jpg")]
+        path = os.path.join(img_dir, file)
+        stat = os.stat(path)
+        present.add(song_id)
+
+        entry = cached.get(song_id)
+        complete = thumbnail_name(song_id) in existing
+        if entry and complete and entry[1] == stat.st_size and entry[2] == stat.st_mtime:
+            continue
+        digest = file_hash(path)
+        if entry and complete and entry[0] == digest:
+            conn.execute(
+                "UPDATE thumbnails SET source_size = ?, source_mtime = ? WHERE id = ?",
+                (stat.st_size, stat.st_mtime, song_id)
+            )
+            continue
+        tasks.append((song_id, path, digest, stat))
+
+    failed = 0
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(make_thumbnails, song_id, path, digest, thumb_dir): stat
+                for song_id, path, digest, stat in tasks
+            }
+            for future in as_completed(futures):
+                stat = futures[future]
+                try:
+                    song_id, digest = future.result()
+                except Exception as e:
+                    print(f"Error generating thumbnails: {e}")
+                    failed += 1
+                    continue
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO thumbnails
+                        (id, source_hash, source_size, source_mtime, generated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (song_id, digest, stat.st_size, stat.st_mtime, int(time.time()))
+                )
+
+    # Drop thumbnails of songs whose album art was deleted
+    for song_id in set(cached) - present:
+        remove_thumbnails(song_id, thumb_dir)
+        conn.execute("DELETE FROM thumbnails WHERE id = ?", (song_id,))
+    conn.commit()
+    return len(tasks) - failed, failed
+
+# ------- Generation Command -------
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate WebP thumbnails of the album art.")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    with sqlite3.connect(DB_PATH) as conn:
+        generated, failed = generate_thumbnails(conn, workers=args.workers)
+
+    print(f"\nSummary:")
+    print(f"  - Generated thumbnails for {generated} images in {time.time() - start_time:.1f}s")
+    print(f"  - {failed} images failed")
+
+if __name__ == "__main__":
+    main()